@@ -11,16 +11,15 @@ def Create_Directories():
     # Imports
     import os
 
-    # Create the subdirectories starting from Grades
-    os.makedirs("Grades/Core", exist_ok=True)
-    os.makedirs("Grades/Co-op", exist_ok=True)
-    os.makedirs("Grades/ENCM", exist_ok=True)
-    os.makedirs("Grades/ENCV", exist_ok=True)
-    os.makedirs("Grades/ENEL", exist_ok=True)
-    os.makedirs("Grades/ENMC", exist_ok=True)
-    os.makedirs("Grades/ENPR", exist_ok=True)
-    os.makedirs("Grades/ONAE", exist_ok=True)
-    os.makedirs("Grades/ENUD", exist_ok=True)
+    # Subdirectories of Grades to create
+    needed = {"Core", "Co-op", "ENCM", "ENCV", "ENEL", "ENMC", "ENPR", "ONAE", "ENUD"}
+
+    # List Grades once and only create the subdirectories that are missing
+    os.makedirs("Grades", exist_ok=True)
+    with os.scandir("Grades") as entries:
+        existing = {e.name for e in entries if e.is_dir()}
+    for d in needed - existing:
+        os.mkdir("Grades/" + d)
 
     # Add the histograms folder
     os.makedirs("Histograms", exist_ok=True)
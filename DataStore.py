@@ -1,9 +1,290 @@
 import pandas as pd
-from collections import defaultdict
+import numpy as np
 import os
 import globals
 import re
 import logging
+import functools
+import glob
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# python-calamine is an optional, much faster xlsx reader. When it is not
+# installed, workbooks get read with openpyxl instead, which Pandas already opens
+# in read-only mode so the rows are streamed out of the file
+try:
+    import python_calamine
+    _EXCEL_ENGINE = 'calamine'
+except ImportError:
+    _EXCEL_ENGINE = 'openpyxl'
+
+# pyahocorasick is optional. It matches many literal query terms in a single pass
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# The directory above the project, where the Indicators and Grades folders live by default
+_PARENT_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Parquet copies of the Excel sheets get kept here, away from the sheets themselves
+_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+
+# pyarrow is optional. When it is installed, sheets get cached as Parquet files. With
+# pandas >= 2.0, string columns can also be stored in Arrow buffers and matched with
+# Arrow's own string functions
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+_ARROW_STRING = None
+if pyarrow is not None and hasattr(pd, 'ArrowDtype'):
+    _ARROW_STRING = pd.ArrowDtype(pyarrow.string())
+
+# How many query_indicators results each DataStore remembers
+_QUERY_CACHE_SIZE = 256
+
+# Characters that make a query term a regular expression rather than plain text
+_REGEX_METACHARS = set(r'.^$*+?{}[]|()\\')
+
+
+def _read_excel(path, dtype=None):
+    """Read the first sheet of an Excel file
+
+    Uses python-calamine through Pandas if it is installed, and openpyxl otherwise.
+    Pandas opens workbooks with openpyxl in read-only mode, so the rows get streamed
+    out of the file instead of the whole workbook being built in memory first.
+
+    Args:
+        path(string): The path to the Excel file
+        dtype: The type to convert the columns to. Defaults to letting Pandas decide
+
+    Returns:
+        pd.DataFrame: The contents of the first sheet in the Excel file
+    """
+    # Open the workbook once and parse from the handle. If more sheets ever need
+    # to be read from the same workbook, parse them from xf as well so that the
+    # file and its shared strings table only get loaded once
+    with pd.ExcelFile(path, engine=_EXCEL_ENGINE) as xf:
+        return xf.parse(xf.sheet_names[0], dtype=dtype)
+
+
+def _cache_prefix(path, dtype=None):
+    """Find the start of the file names used for the cached copies of an Excel file
+
+    The prefix is the file name plus a hash of its full path and the type its columns
+    were read as, so that sheets with the same name in different folders, or the same
+    sheet read with different types, don't share copies
+
+    Args:
+        path(string): The path to the Excel file
+        dtype: The type the columns get converted to when the file is read
+
+    Returns:
+        string: The path to the cached copies, without the version or extension
+    """
+    key = '{}|{!r}'.format(os.path.abspath(path), dtype)
+    digest = hashlib.md5(key.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(_CACHE_DIR, '{}-{}'.format(os.path.basename(path), digest))
+
+
+def _load_sheet(path, dtype=None):
+    """Load an Excel sheet, using an on-disk Parquet copy when it is up to date
+
+    The first time a sheet is loaded, a copy of it gets saved in the .cache folder
+    of the project. The name of the copy includes the modification time and size of
+    the Excel file and the type its columns were read as, so following loads only use
+    it if the Excel file is exactly the one the copy was made from and gets read the
+    same way, which skips parsing the workbook entirely. Copies of
+    older versions of the file get deleted when a new one is saved.
+
+    If pyarrow is not installed, the Excel file just gets read like normal. If a
+    sheet can't be saved as Parquet (e.g. a column mixes numbers and text), that
+    gets noted in the cache so it isn't tried again until the Excel file changes.
+
+    Args:
+        path(string): The path to the Excel file
+        dtype: The type to convert the columns to. Defaults to letting Pandas decide
+
+    Returns:
+        pd.DataFrame: The contents of the first sheet in the Excel file
+    """
+    if pyarrow is None:
+        return _read_excel(path, dtype=dtype)
+
+    prefix = _cache_prefix(path, dtype)
+    stat = os.stat(path)
+    version = '{}-{}-{}'.format(prefix, stat.st_mtime_ns, stat.st_size)
+    cache = version + '.parquet'
+    skip = version + '.skip'
+    if os.path.exists(cache):
+        try:
+            logging.debug("Loading %s from cached copy %s", path, cache)
+            df = pd.read_parquet(cache, engine='pyarrow')
+            # Parquet brings empty cells in text columns back as None, where reading
+            # the Excel file gives NaN
+            return df.where(df.notna(), np.nan)
+        except Exception as exc:
+            logging.warning("Unable to read the cached copy of %s, reading the Excel "
+                "file instead: %s", path, exc)
+
+    df = _read_excel(path, dtype=dtype)
+    if os.path.exists(skip):
+        logging.debug("%s can't be cached, so it was read from the Excel file", path)
+        return df
+
+    # Clear out the copies of other versions of the file before saving this one
+    for old in glob.glob(glob.escape(prefix) + '-*'):
+        try:
+            os.remove(old)
+        except OSError as exc:
+            logging.warning("Unable to delete the old cached copy %s: %s", old, exc)
+    try:
+        os.makedirs(_CACHE_DIR, exist_ok=True)
+        df.to_parquet(cache, engine='pyarrow')
+    except Exception as exc:
+        logging.warning("Unable to save a cached copy of %s, it will be read from the "
+            "Excel file until it changes: %s", path, exc)
+        try:
+            if os.path.exists(cache):
+                os.remove(cache)
+            open(skip, 'w').close()
+        except OSError:
+            pass
+    return df
+
+
+def _load_indicators(path):
+    """Load an indicator lookup table
+
+    Columns with only a few distinct values (e.g. Graduate Attribute, Level,
+    Method of Assessment) get stored as Pandas categories. Each distinct value
+    is then only stored and searched once, no matter how many rows it is in. If
+    pyarrow is installed, the rest of the string columns get stored as Arrow strings.
+
+    Args:
+        path(string): The path to the indicator Excel file
+
+    Returns:
+        pd.DataFrame: The indicator lookup table
+    """
+    df = _load_sheet(path, dtype=str)
+    # Text columns are object columns before pandas 3 and str columns from then on
+    for c in df.select_dtypes(include=['object', 'string']).columns:
+        if df[c].nunique() < len(df.index)//2:
+            df[c] = df[c].astype('category')
+        # Keep the other strings in Arrow buffers if possible. Columns with empty cells are
+        # left alone, since Arrow would turn those cells into pd.NA instead of NaN
+        elif _ARROW_STRING is not None and not df[c].hasnans:
+            df[c] = df[c].astype(_ARROW_STRING)
+    return df
+
+
+@functools.lru_cache(maxsize=512)
+def _match_column(columns, key):
+    """Find the first column name that contains the query key, ignoring case
+
+    Indicator tables keep the same columns between queries, so the matches are
+    cached and only the first lookup for a key has to lowercase the column names.
+
+    Args:
+        columns(tuple(string)): The column names of the indicator table
+        key(string): The query key (e.g. 'indicator' matches 'Indicator #')
+
+    Returns:
+        string: The matching column name, or None if no column matched
+    """
+    key = key.lower()
+    return next((c for c in columns if key in c.lower()), None)
+
+
+@functools.lru_cache(maxsize=512)
+def _compile_pattern(terms):
+    """Compile a regular expression that matches any of the query terms
+
+    The same queries tend to get run over and over during report generation, so
+    compiled patterns are cached.
+
+    Args:
+        terms(tuple(string)): The query terms. Has to be a tuple so it can be hashed
+
+    Returns:
+        re.Pattern: The compiled pattern
+    """
+    return re.compile('|'.join(terms))
+
+
+def _is_literal(terms):
+    """Check if all query terms are plain, non-empty text (i.e. not regular expressions)
+
+    Args:
+        terms(iterable(string)): The query terms
+
+    Returns:
+        bool: True if none of the terms are empty or contain regex special characters
+    """
+    return all(terms) and not any(ch in _REGEX_METACHARS for t in terms for ch in t)
+
+
+@functools.lru_cache(maxsize=512)
+def _build_automaton(terms):
+    """Build an Aho-Corasick automaton that finds any of the query terms
+
+    Automatons are cached the same way as compiled patterns.
+
+    Args:
+        terms(tuple(string)): The literal query terms. Has to be a tuple so it can be hashed
+
+    Returns:
+        ahocorasick.Automaton: The finished automaton
+    """
+    automaton = ahocorasick.Automaton()
+    for t in terms:
+        automaton.add_word(t, t)
+    automaton.make_automaton()
+    return automaton
+
+
+def _contains_any(column, terms):
+    """Check which values of a column contain any of the query terms
+
+    Args:
+        column(pd.Series): A column of the indicator lookup table
+        terms(tuple(string)): The query terms. They get treated as a regular expression
+            unless they are all plain text, in which case a plain substring search is
+            used instead
+
+    Returns:
+        np.ndarray(bool): True for every value that matched. Empty values never match
+    """
+    # Categorical columns only need their distinct values checked. The result then gets
+    # spread across the rows using the category codes. Empty values have a code of -1,
+    # so a False gets put on the end for them to land on
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        matches = np.append(_contains_any(pd.Series(column.cat.categories), terms), False)
+        return matches[column.cat.codes.to_numpy()]
+
+    literal = _is_literal(terms)
+    if literal and len(terms) == 1:
+        # A single plain-text term only needs a substring search
+        matches = column.str.contains(terms[0], regex=False, na=False)
+    elif literal and ahocorasick:
+        # Find all of the plain-text terms in one pass over each value
+        automaton = _build_automaton(terms)
+        matches = column.map(lambda s: isinstance(s, str) and next(automaton.iter(s), None) is not None)
+    else:
+        if _ARROW_STRING is not None and column.dtype == _ARROW_STRING:
+            try:
+                # Arrow's regex engine (RE2) handles the usual query patterns
+                return column.str.contains('|'.join(terms)).to_numpy(dtype=bool)
+            except Exception:
+                # Anything RE2 cannot do falls back to Python's re module
+                column = column.astype(object)
+        # Use a regular expression to get the parse to work
+        matches = column.str.contains(_compile_pattern(terms), na=False)
+    return matches.to_numpy(dtype=bool)
+
 
 class DataStore(object):
     """Data Storage object
@@ -15,7 +296,10 @@ class DataStore(object):
     Attributes:
         indicators(dict(pd.DataFrame)): A dictionary of Pandas DataFrames that store
             the indicator information for each loaded program. The dictionary gets
-            keyed by program
+            keyed by program. Every column is read in as strings so that the
+            queries can match against them directly. A program's indicators get
+            loaded the first time they are needed (see load_indicators)
+        programs(list(string)): The programs that the DataStore was set up for
         indicators_loc(string): The path to the location of the indicator sheets
         grades_loc(string): The path to the top folder for the grade storage
         unique_courses(pd.DataFrame): A Pandas DataFrame that contains information
@@ -34,13 +318,15 @@ class DataStore(object):
 
 
     def __init__(self, programs = None, indicators_loc = None, grades_loc = None):
-        """Initialization, load indicators
+        """Initialization
 
-        Initializes the indicator DataFrame with data from the programs list
+        Sets up the file locations. Indicators do not get loaded here; they get
+        loaded the first time a program is queried, or all at once with
+        load_indicators
 
         Args:
             programs(list(string)): A list of strings containing the programs to
-                load indicators for. Defaults to loading indicators for every program
+                load indicators for. Defaults to every program
             indicators_loc(string): The file location for the Indicator lists. Defaults to
                 finding them in the project directory using OS.path
             grades_loc(string): The location of the grades sheets. Defaults to finding
@@ -49,47 +335,88 @@ class DataStore(object):
         logging.info("Start of DataStore initialization")
         logging.info("Setting up location of Indicator lookup tables")
         if not indicators_loc:
-            pth = os.path.dirname(__file__) + '/../Indicators'
+            pth = os.path.join(_PARENT_DIR, 'Indicators')
             logging.debug("No indicator directory passed to the constructor - using %s", pth)
             self.indicators_loc = pth
         else:
-            self.indicators_loc = indicators_loc
+            self.indicators_loc = os.path.normpath(indicators_loc)
 
-        logging.info("Loading indicator lookup tables from programs list")
-        self.indicators = defaultdict()
+        self.indicators = dict()
+        # Rows matched by recent query_indicators calls, keyed by program and queries.
+        # Least recently used entries get dropped once there are _QUERY_CACHE_SIZE
+        self._query_cache = OrderedDict()
 
         # Get a list of programs to open indicator files for
         if not programs:
             logging.debug("No program list passed to the constructor - using all programs")
             programs = globals.all_programs.copy()
-
-        # Formatted string to open indicator files with
-        filestring = "{pth}/{prgm} Indicators.xlsx"
-        #------------------------------------------------------------------------------------
-        # Iterate across the programs list and load the indicator files
-        #------------------------------------------------------------------------------------
-        for p in programs:
-            logging.debug("Attempting to load indicators for %s using file %s",
-                p, filestring.format(pth = self.indicators_loc, prgm = p)
-            )
-            self.indicators[p] = pd.read_excel(filestring.format(pth = self.indicators_loc, prgm = p))
+        self.programs = programs
 
         # Find out where to find the grades
         logging.info("Setting up location to find grades")
         if not grades_loc:
-            pth = os.path.dirname(__file__) + '/../Grades'
+            pth = os.path.join(_PARENT_DIR, 'Grades')
             logging.debug("No grades location passed to the constructor, using %s", pth)
             self.grades_loc = pth
         else:
-            self.grades_loc = grades_loc
+            self.grades_loc = os.path.normpath(grades_loc)
 
         # Open the unique course file
         logging.info("Opening the Unique Courses file")
-        self.unique_courses = pd.read_excel(os.path.dirname(__file__) + '/../Unique Courses.xlsx')
+        self.unique_courses = _load_sheet(os.path.join(_PARENT_DIR, 'Unique Courses.xlsx'))
 
         logging.info("DataStore object initialization complete!")
 
 
+    def _get_indicators(self, program):
+        """Get a program's indicators, loading them if they are not loaded yet
+
+        Args:
+            program(string): The program to get the indicators of
+
+        Returns:
+            pd.DataFrame: The program's indicator lookup table
+
+        Exceptions:
+            FileNotFoundError: Raised when the program has no indicator file
+        """
+        if program not in self.indicators:
+            file = os.path.join(self.indicators_loc, "{} Indicators.xlsx".format(program))
+            logging.debug("Attempting to load indicators for %s using file %s", program, file)
+            self.indicators[program] = _load_indicators(file)
+        return self.indicators[program]
+
+
+    def load_indicators(self, programs=None):
+        """Load the indicators for a list of programs ahead of time
+
+        Reading a workbook is mostly file I/O and parsing, so the files get loaded on
+        a pool of threads instead of one after the other. Use this before querying
+        many programs in a row. Programs that are already loaded get skipped, and so do
+        programs without an indicator file (with a warning).
+
+        Args:
+            programs(list(string)): The programs to load indicators for. Defaults to the
+                programs the DataStore was set up with
+        """
+        if not programs:
+            programs = self.programs
+        to_load = [p for p in programs if p not in self.indicators]
+        if not to_load:
+            return
+
+        logging.info("Loading indicator lookup tables for %s", ', '.join(to_load))
+
+        def load(p):
+            try:
+                self._get_indicators(p)
+            except FileNotFoundError:
+                logging.warning("No indicator file found for %s", p)
+
+        with ThreadPoolExecutor(max_workers=min(8, len(to_load))) as executor:
+            list(executor.map(load, to_load))
+
+
     def query_indicators(self, program, dict_of_queries=None):
         """Query indicators sheet
 
@@ -107,37 +434,69 @@ class DataStore(object):
             just return the corresponding program's indicator DataFrame
 
         Returns:
-            DataFrame: The DataFrame query
+            DataFrame: The DataFrame query. Each call returns a new DataFrame, so
+                changing it does not affect later queries
         """
         logging.info("Start of query_indicators method")
-        # Try to set the last query to the program's indicators
-        try:
-            last_query = self.indicators[program]
-        # If it doesn't work, try opening the program's indicators first
-        except KeyError:
-            logging.warning("Indicators for %s apparently not loaded. Loading now...", program)
-            self.indicators[program] = pd.read_excel(self.indicators_loc + "/{} Indicators.xlsx".format(program))
-            last_query = self.indicators[program]
-
-        logging.debug("Querying %s", str(dict_of_queries))
-
-        # Query iteratively using the dict keys
-        if dict_of_queries:
-            for key in dict_of_queries.keys():
-                # Find the spreadsheet column that closely matches the dictionary key
-                col = next((s for s in last_query.columns if key.lower() in s.lower()), None)
-                logging.debug("Query for %s mapped to %s in indicator table", key, col)
-                #---------------------------------------------------------------------------------
-                # Query to take a value only if the query list entry contains part of the value.
-                # The main thing here is that to get the value out, only part of the value in the
-                # query list has to appear. It's done this way so that if you wanted to get all
-                # 'KB' indicators, for example, you could do so by adding 'KB' to the list of
-                # indicators to query
-                #---------------------------------------------------------------------------------
-                # Use a regular expression to get the parse to work
-                pat = re.compile('|'.join(dict_of_queries[key]))
-                query = last_query[col].str.contains(pat)
-                last_query = last_query[query]    # Query the DataFrame
-                logging.debug("Query for %s resulted in %d results", key, len(last_query.index))
-
-        return last_query
+        indicators = self._get_indicators(program)
+
+        logging.debug("Querying %s", dict_of_queries)
+
+        if not dict_of_queries:
+            # Hand out a copy, so that changing it doesn't change the stored table
+            return indicators.copy()
+
+        # Reuse the rows matched by an earlier identical query, as long as the program's
+        # indicator table has not been replaced since then
+        cache_key = (program, frozenset((k, tuple(v)) for k, v in dict_of_queries.items()))
+        cached = self._query_cache.get(cache_key)
+        if cached and cached[0] is indicators:
+            logging.debug("Reusing the results of an earlier query")
+            self._query_cache.move_to_end(cache_key)
+            return indicators.iloc[cached[1]]
+
+        # Find the spreadsheet column that closely matches each dictionary key before
+        # any of the matching runs, so a bad key fails straight away
+        columns = tuple(indicators.columns)
+        queries = list()
+        for key, terms in dict_of_queries.items():
+            col = _match_column(columns, key)
+            logging.debug("Query for %s mapped to %s in indicator table", key, col)
+            if col is None:
+                raise KeyError("No column in the {} indicator table matches the query key '{}'".format(
+                    program, key
+                ))
+            queries.append((col, tuple(terms)))
+        # Match the categorical columns first since they are the cheapest to check, which
+        # makes it more likely that the query can stop early on an empty result
+        queries.sort(key=lambda q: not isinstance(indicators[q[0]].dtype, pd.CategoricalDtype))
+
+        #---------------------------------------------------------------------------------
+        # Query to take a value only if the query list entry contains part of the value.
+        # The main thing here is that to get the value out, only part of the value in the
+        # query list has to appear. It's done this way so that if you wanted to get all
+        # 'KB' indicators, for example, you could do so by adding 'KB' to the list of
+        # indicators to query
+        #
+        # Each column's matches get ANDed into one mask over the full table, and the table
+        # only gets sliced once at the end instead of copying a smaller DataFrame for
+        # every key. DataFrame.query/numexpr cannot do substring matching, so the columns
+        # are matched one by one through _contains_any instead.
+        #---------------------------------------------------------------------------------
+        mask = np.ones(len(indicators.index), dtype=bool)
+        for col, terms in queries:
+            mask &= _contains_any(indicators[col], terms)
+            logging.debug("Query on %s resulted in %d results", col, np.count_nonzero(mask))
+            # Nothing left to filter, so the remaining columns do not need to be matched
+            if not mask.any():
+                break
+
+        # Only the positions of the matching rows get kept, and the table is sliced
+        # again on every hit so callers never share a DataFrame
+        rows = np.flatnonzero(mask)
+        rows.flags.writeable = False
+        self._query_cache[cache_key] = (indicators, rows)
+        self._query_cache.move_to_end(cache_key)
+        if len(self._query_cache) > _QUERY_CACHE_SIZE:
+            self._query_cache.popitem(last=False)
+        return indicators.iloc[rows]    # Query the DataFrame
@@ -52,6 +52,8 @@ default = {
     "grade_backup_dirs": "Core, Co-op, ECE"
 }
 
-f = open('../config/default.json', 'w+')
-f.write(json.dumps(default, indent=4))
+# The checked in default.json is indented by 4 spaces, which orjson can't write, so
+# it stays on the json module
+with open('../config/default.json', 'w') as f:
+    f.write(json.dumps(default, indent=4))
 print("default.json generated successfully")
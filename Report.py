@@ -1,13 +1,38 @@
 import plotly.graph_objs as go
-import plotly.io as pio
 import textformatting as tf
 import plotly_object_generation as pog
+import fast_hist
 from ReportConfig import ReportConfig
-import os
-from collections import defaultdict
 import numpy as np
 import logging
 import pandas as pd
+import os
+import atexit
+
+# The process that started kaleido's background browser with Report.prewarm, if any. A
+# forked process doesn't get the browser's thread, so it has to start its own
+_export_server_pid = None
+
+
+def _has_strings(column):
+    """Check if a column of grades contains any strings
+
+    Pandas infers the type of the whole column in C, so the values only get looked at
+    one by one when the column has mixed types
+
+    Args:
+        column(pd.Series): The column to check. Null values are ignored
+
+    Returns:
+        bool: True if any value in the column is a string
+    """
+    kind = pd.api.types.infer_dtype(column, skipna=True)
+    if kind == 'string':
+        return True
+    if kind.startswith('mixed'):
+        return any(isinstance(x, str) for x in column)
+    return False
+
 
 class Report(object):
     """Inputs-based Report class using Plot.ly(https://plot.ly/python/) to generate histograms
@@ -20,7 +45,8 @@ class Report(object):
     Attributes:
         config: A ReportConfig object
         layout: A plotly.Layout that generates from certain attributes in
-            ReportConfig
+            ReportConfig. It only gets built if it is used; otherwise, saving uses
+            the layout shared by every Report with the same config options
         indicator_data: A dictionary containing any information needed on a
             histogram header. The dictionary needs to at least contain
             "Graduate Attribute" as one of its keys, but other than that,
@@ -28,7 +54,7 @@ class Report(object):
         bins: The bin range for this assessment to use. Should be a 4-digit
             list if the bottom bin restriction is 0. If the bins are passed as
             5-digit, then the first one will be used as the lowest bin
-        _annotations: A list of plotly.layout.Annotation objects that the object
+        _annotations: A list of plotly annotation dicts that the object
             uses when the Report is built into a Figure
     
     See also:
@@ -67,7 +93,7 @@ class Report(object):
         # Append 0 to the bins front if the size is 4
         if len(bins) == 4:
             self.bins = [0] + bins
-            logging.debug("Indicator bins were turned into: %s", ', '.join(str(x) for x in self.bins))
+            logging.debug("Indicator bins were turned into: %s", self.bins)
         else:
             self.bins = bins
 
@@ -78,18 +104,50 @@ class Report(object):
             'Exceeds Expectations'
         ]
 
-        logging.debug("Indicator bins: %s", ', '.join(str(x) for x in self.bins))
-        logging.debug("Indicator data: %s", str(self.indicator_data))
+        logging.debug("Indicator bins: %s", self.bins)
+        logging.debug("Indicator data: %s", self.indicator_data)
+
+        # Work out the histogram edges once. If the difference between the last 2 bins
+        # is 1, assume that these are co-op bins. If so, add 1 to each bin except the
+        # first so that every co-op score lands in its own bin
+        edges = np.asarray(self.bins, dtype=np.float64)
+        if edges[-1] - edges[-2] == 1:
+            edges[1:] += 1
+        # With show_NDA, -1 goes in front of the bins to catch the NDA entries
+        self._edges = edges
+        self._edges_NDA = np.concatenate(([-1.0], edges))
+        self._bin_labels = tuple(self.bin_labels)
+        self._bin_labels_NDA = ("No Data Available",) + self._bin_labels
+
+        # Work out the fonts once so that every trace and annotation can share them
+        self._barcount_font = dict(size=self.config.font_px('barcounts'))
+        self._GA_font = dict(size=self.config.font_px('GA_text'))
+        self._annotation_font = dict(size=self.config.font_px('annotations'))
+        self._title_font = dict(size=self.config.font_px('graph_title'))
 
         # Set up the plotly objects
         logging.info("Setting up plotly things, including a list of traces, a list of annotations, and a layout")
         self.traces=list()
-        self.layout=pog.generate_layout(self.config)
+        # The layout only gets built if something asks for it. See the layout property
+        self._layout = None
         self._annotations = list()
 
         logging.info("Report object initialization complete!")
 
 
+    @property
+    def layout(self):
+        """The Report's plotly Layout, generated from the config on first use"""
+        if self._layout is None:
+            self._layout = pog.generate_layout(self.config)
+        return self._layout
+
+
+    @layout.setter
+    def layout(self, layout):
+        self._layout = layout
+
+
     def plot(self, grades):
         """Plot the stored assessment
 
@@ -110,83 +168,86 @@ class Report(object):
               moving away from np.histogram
         """
         logging.info("Setting up required resources for plotting")
-        # Store the data in dicts of NumPy arrays before converting to barcharts
-        data = defaultdict()
-        # Copy the bin ranges
-        bins_copy = self.bins.copy()
-
-        # If the difference between the last 2 bins is 1, assume that these are
-        # co-op bins. If so, add 1 to each bin so that NumPy's histogram will
-        # work properly.
-        if bins_copy[len(bins_copy)-1] - bins_copy[len(bins_copy)-2] == 1:
-            for i in range (1, len(bins_copy)):
-                bins_copy[i] += 1
-
-        # Also copy the bin labels
-        bin_labels_copy = self.bin_labels.copy()
-
-        # if show_NDA is True, add -1 to the front of the bins
-        if self.config.show_NDA == True:
-            logging.info("Show NDA is set to True, adding -1 to front of bins")
-            bins_copy = [-1.0] + bins_copy
-        logging.debug("Bins being passed to NumPy histogram: %s", ', '.join(str(x) for x in bins_copy))
-
-        # Histogram data by column and simultaneously check if NDA entries need to be removed
-        delete_NDA = True
-        for col in grades.columns:
-            # Remove null values from the column that Pandas has to put there
-            data_to_histogram = list()
-            for x in grades[col]:
-                if not pd.isnull(x):
-                    data_to_histogram.append(x)
-                # Raise an error if the value is a string type because NumPy will
-                # just complain anyways
-                if isinstance(x, type('string')):
-                    error = "A value in the {} grades for {} {} is not a number. Please fix and try again.".format(
-                        self.indicator_data['Program'],
-                        self.indicator_data['Course'],
-                        self.indicator_data['Assessment']
-                    )
-                    raise ValueError(error)
-            # Add histogrammed grades to the data dict, converted to percentage
-            logging.info("Running NumPy histogram")
-            data[col] = np.histogram(data_to_histogram, bins=bins_copy)[0] / len(data_to_histogram) * 100
-            logging.debug("Data added to data[%s]: %s", col, ', '.join(str(x) for x in data[col]))
-            # Check to see if the NDA value in this data entry exceeds the NDA threshold
-            if self.config.show_NDA == True and delete_NDA == True:
-                logging.info("Show NDA is True, therefore checking to see if threshold is exceeded. NDA threshold: %s", str(self.config.NDA_threshold))
-                if data[col][0] >= self.config.NDA_threshold*100:
-                    logging.debug("Threshold exceeded!")
-                    # Add the 'No Data Available' bin label
-                    bin_labels_copy = ["No Data Available"] + bin_labels_copy
-                    delete_NDA = False
-
-        # Remove the NDA bins if they have to be removed
-        if delete_NDA == True:
-            logging.info("No value exceeded the threshold, so NDA bins will be stripped")
-            for key in data.keys():
-                data[key] = np.delete(data[key], 0)
+        # Pick the precomputed bin edges and labels. No copies get made here, since
+        # neither of them gets modified
+        if self.config.show_NDA:
+            logging.info("Show NDA is set to True, using the bins with -1 at the front")
+            edges = self._edges_NDA
+        else:
+            edges = self._edges
+        bin_labels = self._bin_labels
+        logging.debug("Bins being passed to NumPy histogram: %s", edges)
+
+        # Make sure that every grade is a number before handing them to NumPy
+        names = list(grades.columns)
+        all_numeric = True
+        for col, dtype in grades.dtypes.items():
+            # Columns with a numeric dtype can't hold strings, so only the others need
+            # to be looked at. Raise an error if a value is a string type because NumPy
+            # will just complain anyways
+            if pd.api.types.is_numeric_dtype(dtype):
+                continue
+            all_numeric = False
+            if _has_strings(grades[col]):
+                error = "A value in the {} grades for {} {} is not a number. Please fix and try again.".format(
+                    self.indicator_data['Program'],
+                    self.indicator_data['Course'],
+                    self.indicator_data['Assessment']
+                )
+                raise ValueError(error)
+
+        # Convert the grades to a column-major float array once, so that every column
+        # is a contiguous slice instead of a new Series. Null values become NaN. When
+        # every column is numeric (including nullable integer columns), pandas can do
+        # the whole conversion itself without going through Python objects
+        if all_numeric:
+            grades_arr = grades.to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            grades_arr = grades.to_numpy()
+            grades_arr = np.where(pd.isnull(grades_arr), np.nan, grades_arr)
+        grades_arr = np.asfortranarray(grades_arr, dtype=np.float64)
+
+        # Work out the percentages, then pick the bin labels that match them
+        counts, NDA_shown = Report._compute_counts(
+            grades_arr, edges, self.config.show_NDA, self.config.NDA_threshold
+        )
+        logging.debug("Data added to counts for %s: %s", names, counts)
+        if NDA_shown:
+            # Use the bin labels that start with 'No Data Available'
+            bin_labels = self._bin_labels_NDA
 
         # Check to see if the number of maximum plots was exceeded
-        if len(data) > self.config.max_plots:
+        if len(names) > self.config.max_plots:
             logging.warning("The number of plots for this histogram exceeded the threshold in ReportConfig!")
-            # Remove data plots by first occurence in the list of keys
-            while len(data) > self.config.max_plots:
-                removed = data.pop(list(data.keys())[0])
+            # Remove data plots by first occurence in the list of names
+            excess = len(names) - self.config.max_plots
+            for removed in names[:excess]:
                 logging.warning("Removed data set for %s", removed)
+            names = names[excess:]
+            counts = counts[excess:]
 
-        # Bar the data
+        # Bar the data. These settings are the same for every bar trace
         logging.info("Barring the data now")
-        logging.debug("Bin labels being passed to plotly bar: %s", ', '.join(bin_labels_copy))
-        for key in data.keys():
-            # Add percentage text labels only if add_percents is True
+        bar_common = dict(
+            textposition = 'auto',
+            constraintext = 'inside',
+            textfont = self._barcount_font
+        )
+        logging.debug("Bin labels being passed to plotly bar: %s", bin_labels)
+        # Add percentage text labels only if add_percents is True. The decision is the
+        # same for every data set, so make it once before walking the data
+        if not self.config.add_percents:
+            logging.debug("self.config.add_percents is %s, bar text set to None", self.config.add_percents)
+            texts = [None] * len(names)
+        else:
+            logging.debug("self.config.add_percents is %s, setting bar text to percentages", self.config.add_percents)
+            texts = tf.format_percents_2d(counts)
+        # Make room for every trace up front and fill the slots in by index. Any traces
+        # from an earlier call to plot are kept in front of the new ones
+        first = len(self.traces)
+        self.traces.extend([None] * len(names))
+        for i, (key, y, text) in enumerate(zip(names, counts, texts), first):
             logging.debug("Barring data for set %s", key)
-            if not self.config.add_percents:
-                logging.debug("self.config.add_percents is %s, bar text set to None", str(self.config.add_percents))
-                text = None
-            else:
-                logging.debug("self.config.add_percents is %s, setting bar text to percentages", str(self.config.add_percents))
-                text = tf.format_percents(data[key])
             #--------------------------------------------------------------------------------
             # TODO: Allow custom cohort coloring
             #
@@ -205,29 +266,64 @@ class Report(object):
             # It is not possible to add patterns to bar plots with Plotly (i.e. stripes,
             # dots, etc.)
             #--------------------------------------------------------------------------------
+            # The trace is kept as a plain dict so that Plotly only validates it once,
+            # when the Figure gets built in save
             logging.debug("Adding the plotly bar trace now")
-            self.traces.append(go.Bar(
+            self.traces[i] = dict(
+                type = 'bar',
                 name = key,
-                x = bin_labels_copy, y = data[key],
+                x = bin_labels, y = y,
                 text = text,
-                textposition = 'auto',
-                constraintext = 'inside',
-                textfont=dict(size=int(self.config.font_sizes['barcounts']/100*self.config.dpi))
-            ))
+                **bar_common
+            )
 
         logging.info("Barring complete!")
 
 
-    def _append_annotations(self):
-        """Append annotations to self.layout.annotations
+    @staticmethod
+    def _compute_counts(grades_arr, edges, show_NDA, NDA_threshold):
+        """Histogram the grades into percentages
+
+        Only works with NumPy arrays and plain values, not with the Report object, so
+        it can run anywhere (e.g. in another process) and its output can be pickled
 
-        This method was originally created to try and fix a nonexistent workaround.
-        However, since there was no need to make a workaround, this method is
-        pretty redundant now, but it's staying here anyways for the time being
+        Args:
+            grades_arr(np.ndarray): A 2D float64 array with one data set per column.
+                Null values should be NaN
+            edges(np.ndarray): The bin edges. When show_NDA is True, the first bin
+                should be the NDA bin
+            show_NDA(bool): Whether or not the first bin is the NDA bin
+            NDA_threshold(float): The fraction of NDA entries in any one data set
+                that makes the NDA bin show up for all of them
 
+        Returns:
+            tuple(np.ndarray, bool): An array of shape (columns, bins) where row i is
+                the percentage of column i's grades in each bin, and whether or not the
+                NDA bin was kept in it
         """
-        logging.debug("Updating the annotations in the layout using self._annotations")
-        self.layout.update(annotations=self._annotations)
+        # Histogram every column at once. Null values aren't counted, not even in the
+        # number of grades that the percentages are taken out of
+        logging.info("Running NumPy histogram")
+        totals = np.count_nonzero(~np.isnan(grades_arr), axis=0)
+        counts = fast_hist.hist_cols(grades_arr, edges).astype(np.float64)
+        # Normalise every data set in place with one broadcast over the whole array
+        counts /= totals[:, np.newaxis]
+        counts *= 100
+
+        # Check to see if the NDA value in any data set exceeds the NDA threshold. There
+        # are only NDA entries to remove if show_NDA is True
+        if not show_NDA:
+            return counts, False
+        logging.info("Show NDA is True, therefore checking to see if threshold is exceeded. NDA threshold: %s", NDA_threshold)
+        # One comparison across the NDA bin of every data set decides it for all of
+        # them, so the label can only ever get added once
+        any_above = bool(np.any(counts[:, 0] >= NDA_threshold*100))
+        if any_above:
+            logging.debug("Threshold exceeded!")
+            return counts, True
+        # Remove the NDA bins. Slicing gives a view rather than a copy
+        logging.info("No value exceeded the threshold, so NDA bins will be stripped")
+        return counts[:, 1:], False
 
 
     def add_header(self):
@@ -235,36 +331,41 @@ class Report(object):
         # Get the text to add to the graph
         logging.info("Adding header to Report")
         labels, descriptions, title = tf.format_annotation_text(self.indicator_data, self.config.textwrap_lim)
+        # The annotations are kept as plain dicts like the bar traces, so that Plotly
+        # only validates them once when the Figure gets built. All three of them sit at
+        # the same header location and the description and label columns share a font
+        xloc = self.config.header_xloc
+        yloc = self.config.header_yloc
         self._annotations += [
             # GA
-            go.layout.Annotation(
-                x=self.config.header_xloc, y=self.config.header_yloc,
+            dict(
+                x=xloc, y=yloc,
                 showarrow=False,
                 text=title,
                 xref='paper', yref='paper',
                 xanchor='left',
                 align = 'left',
-                font = dict(size=int(self.config.font_sizes['GA_text']/100*self.config.dpi))
+                font = self._GA_font
             ),
             # Indicator Descriptions
-            go.layout.Annotation(
-                x=self.config.header_xloc, y=self.config.header_yloc,
+            dict(
+                x=xloc, y=yloc,
                 showarrow=False,
                 text=descriptions,
                 xref='paper', yref='paper',
                 xanchor='left',
                 align = 'left',
-                font = dict(size=int(self.config.font_sizes['annotations']/100*self.config.dpi))
+                font = self._annotation_font
             ),
             # Indicator Label Column Thing (the catagories)
-            go.layout.Annotation(
-                x=self.config.header_xloc - 0.02, y=self.config.header_yloc,
+            dict(
+                x=xloc - 0.02, y=yloc,
                 showarrow=False,
                 text=labels,
                 xref='paper', yref='paper',
                 xanchor='right',
                 align = 'left',
-                font = dict(size=int(self.config.font_sizes['annotations']/100*self.config.dpi))
+                font = self._annotation_font
             )
         ]
 
@@ -272,13 +373,13 @@ class Report(object):
     def add_bin_ranges(self):
         """Add bin ranges to bottom of plot"""
         logging.info("Adding bin ranges to Report")
-        self._annotations.append(go.layout.Annotation(
+        self._annotations.append(dict(
             x=0.5, y=-self.config.font_sizes['legend_text']/100*1.7,
             showarrow=False,
             xref='paper',yref='paper',
             xanchor='center', yanchor='bottom',
             align = 'left',
-            font=dict(size=int(self.config.font_sizes['annotations']/100*self.config.dpi)),
+            font=self._annotation_font,
             text=tf.format_bin_ranges(self.bins, self.bin_labels)
             )
         )
@@ -293,24 +394,27 @@ class Report(object):
                 to an empty string
         """
         logging.info("Adding title to graph on the Report")
-        self._annotations.append(go.layout.Annotation(
+        self._annotations.append(dict(
             x=0.5, y=1+self.config.font_sizes['graph_title']/125,
             showarrow=False,
             text=self.config.graph_title.format(cohort),
             xref='paper',yref='paper',
             xanchor='center',
-            font=dict(size=int(self.config.font_sizes['graph_title']/100*self.config.dpi))
+            font=self._title_font
             )
         )
 
-    def save(self, savename, format=None):
-        """Save Report object
+    def _figure(self, savename, format=None):
+        """Build the Plotly figure for the Report and work out where it gets saved
 
         Args:
             savename(string): Save file name
             format(string): The file format to save to. Uses whatever config uses by default.
                 If the file savename does not have the save format attached by default, this
                 program will attach it.
+
+        Returns:
+            tuple: The go.Figure, the save file name with the format attached and the format
         """
         # Format check
         if not format:
@@ -320,14 +424,109 @@ class Report(object):
         if not savename.endswith('.' + format):
             savename += '.' + format
 
-        # Add the annotations to the figure Layout
-        self._append_annotations()
-        # Create a Plotly figure
-        fig = go.Figure(data = self.traces, layout = self.layout)
+        # Create a Plotly figure, handing the annotations over with the layout so that
+        # Plotly only has to validate them once. Unless this Report's layout was used,
+        # start from a copy of the shared layout for the config
+        if self._layout is None:
+            layout = dict(pog.layout_json(self.config))
+        else:
+            layout = self._layout.to_plotly_json()
+        layout['annotations'] = self._annotations
+        return go.Figure(data = self.traces, layout = layout), savename, format
+
+    @staticmethod
+    def prewarm():
+        """Start kaleido's browser so that saving Reports doesn't start one every time
+
+        With kaleido v1.1 or newer, start_sync_server keeps one browser running in the
+        background, and save and save_batch use it instead of starting up a new one for
+        every export. The browser gets shut down when the program exits. Older kaleido
+        versions can't keep a browser running, so nothing happens with those. Calling
+        this more than once in the same process is fine
+
+        Returns:
+            bool: True if there is a running browser for saves to use
+        """
+        global _export_server_pid
+        if _export_server_pid == os.getpid():
+            return True
+        try:
+            import kaleido
+        except ImportError:
+            logging.warning("kaleido is not installed, so Reports can't be saved as images")
+            return False
+        start = getattr(kaleido, 'start_sync_server', None)
+        if start is None:
+            logging.info("The installed kaleido can't keep a browser running between saves")
+            return False
+
+        logging.info("Starting kaleido's browser for saving Reports")
+        start(silence_warnings=True)
+        atexit.register(kaleido.stop_sync_server, silence_warnings=True)
+        _export_server_pid = os.getpid()
+        return True
+
+    def save(self, savename, format=None):
+        """Save Report object
+
+        Args:
+            savename(string): Save file name
+            format(string): The file format to save to. Uses whatever config uses by default.
+                If the file savename does not have the save format attached by default, this
+                program will attach it.
+        """
+        fig, savename, format = self._figure(savename, format)
         # Console print to show that the program is still running
         print("Saving", savename)
         logging.info("Saving Report in %s format", format)
-        pio.write_image(fig, savename, format)
+        # The figure was already validated when it was built, so skip Plotly's second
+        # validation pass and write the image bytes out directly. plotly.io is only
+        # imported when an image gets made, since it is slow to load
+        import plotly.io as pio
+        image = pio.to_image(fig, format=format, validate=False)
+        with open(savename, 'wb') as image_file:
+            image_file.write(image)
+
+    @staticmethod
+    def save_batch(reports, savenames, format=None):
+        """Save many Report objects with one call to the image export engine
+
+        Every Report saved with save starts its own export, while pio.write_images
+        hands all of the figures to kaleido at once, which is a lot faster. The files
+        come out the same as saving each Report with save
+
+        Args:
+            reports(list(Report)): The Reports to save
+            savenames(list(string)): The save file name for each Report
+            format(string): The file format to save to. Uses each Report's config by
+                default. The format gets attached to the save names the same way as save
+
+        Exceptions:
+            ValueError: Raised when there isn't exactly one save name for every Report
+        """
+        if len(reports) != len(savenames):
+            raise ValueError("Got {} Reports to save but {} save names".format(
+                len(reports), len(savenames)))
+        if not reports:
+            return
+
+        figs = list()
+        files = list()
+        formats = list()
+        for report, savename in zip(reports, savenames):
+            fig, savename, fmt = report._figure(savename, format)
+            print("Saving", savename)
+            figs.append(fig)
+            files.append(savename)
+            formats.append(fmt)
+        logging.info("Saving %d Reports in one batch", len(figs))
+        import plotly.io as pio
+        # to_image takes the image size from each figure's layout, but write_images
+        # falls back on Plotly's default size, so the sizes get passed in
+        pio.write_images(figs, files, format=formats,
+            width=[fig.layout.width for fig in figs],
+            height=[fig.layout.height for fig in figs],
+            validate=False)
 
     @staticmethod
     def generate_report(indicator_data, bins, config, grades):
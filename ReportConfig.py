@@ -1,7 +1,78 @@
 import json
-import base64
 import os
 import logging
+import functools
+import types
+
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
+
+
+# Default locations, worked out once when the module gets imported. The Indicators,
+# Grades and Histograms folders live in the directory above the project
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_PARENT_DIR = os.path.normpath(os.path.join(_HERE, '..'))
+_LOGO_PATH = os.path.join(_HERE, 'MUN_Logo_RGB2.png')
+_CONFIG_DIR = os.path.join(_HERE, 'config')
+_INDICATORS_LOC = os.path.join(_PARENT_DIR, 'Indicators')
+_GRADES_LOC = os.path.join(_PARENT_DIR, 'Grades')
+_HISTOGRAMS_LOC = os.path.join(_PARENT_DIR, 'Histograms')
+
+# Paper dimensions in inches. Every config starts with its own copy of these
+_PAPER_DIMENSIONS = types.MappingProxyType({
+    'landscape': (11.69, 8.27),
+    'portrait': (8.27, 11.69)
+})
+
+# Parsed config JSON files, keyed by path. Stored as (modified time, parsed contents)
+_json_cache = dict()
+
+
+@functools.lru_cache(maxsize=1)
+def _load_logo():
+    """Read the MUN logo and encode it as a base64 data URI
+
+    The logo never changes while the program runs, so it only gets read and encoded
+    for the first ReportConfig and every one after that reuses the same string
+
+    Returns:
+        string: The MUN logo as a 'data:image/png;base64,...' URI
+    """
+    logging.debug("Opening MUN logo from %s", _LOGO_PATH)
+    # Read the whole file with one unbuffered read instead of in 8 KiB chunks
+    fd = os.open(_LOGO_PATH, os.O_RDONLY)
+    try:
+        logo = os.read(fd, os.fstat(fd).st_size)
+    finally:
+        os.close(fd)
+    encoded_logo = base64.b64encode(logo).decode('ascii')
+    return 'data:image/png;base64,' + encoded_logo
+
+
+def _load_json(path):
+    """Load a config JSON file, reusing the parsed contents if it hasn't changed
+
+    Args:
+        path(string): The path to the JSON file
+
+    Returns:
+        dict: The parsed contents of the file. Don't modify it, since later loads of
+            the same file share it
+
+    Exceptions:
+        FileNotFoundError: Raises an error if the file does not exist
+    """
+    mtime = os.stat(path).st_mtime_ns
+    cached = _json_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    logging.debug("Parsing config file %s", path)
+    with open(path, 'rb') as json_file:
+        contents = json.loads(json_file.read())
+    _json_cache[path] = (mtime, contents)
+    return contents
 
 
 class ReportConfig(object):
@@ -58,8 +129,12 @@ class ReportConfig(object):
 
     Attributes:
         MUN_logo: The MUN logo in base64
-        font_sizes: A dictionary of font sizes used in the Report
-        paper_dimensions: A dictionary of tuples indicating paper dimensions
+        font_sizes: A dictionary of font sizes used in the Report. Use font_px to
+            get them in pixels. Sizes that get set replace the ones derived from
+            annotation_font
+        paper_dimensions: A dictionary of tuples indicating paper dimensions. Each
+            config has its own copy
+        header_keys: The entries of header_attribs as a tuple of strings
         indicators_loc: Where the program can find the indicator master sheets
         grades_loc: Where the program can find grades files
         histograms_loc: Where the program should save histograms
@@ -67,6 +142,20 @@ class ReportConfig(object):
     TODO:
         * Implement a config saving feature using the class?
     """
+    # The attributes every config has. Keys in a JSON config file that aren't listed
+    # here get kept in _other_options, and can still be read as attributes
+    __slots__ = (
+        # JSON-loaded
+        'name', 'annotation_font', 'dpi', 'orientation', 'format', 'max_plots',
+        'add_title', 'graph_title', 'add_percents', 'add_legend', 'add_bin_ranges',
+        'show_NDA', 'NDA_threshold', 'header_attribs', 'header_xloc', 'header_yloc',
+        'textwrap_lim', 'grade_backup_dirs', 'plot_grades_by', 'use_indicators_from',
+        # Not JSON-loaded
+        'MUN_logo', 'paper_dimensions', 'indicators_loc', 'grades_loc', 'histograms_loc',
+        '_font_sizes', '_font_size_overrides', '_font_px', '_header_keys',
+        # Any other options from the JSON config files
+        '_other_options'
+    )
 
 
     def __init__(self, config_file = None, config_path=None):
@@ -82,50 +171,159 @@ class ReportConfig(object):
         """
         logging.info("Start of ReportConfig initialization")
         if not config_path:
-            config_path = os.path.dirname(__file__) + '/config'
+            config_path = _CONFIG_DIR
             logging.debug("Config path not specified, using %s", config_path)
 
-        logging.info("Setting up paper dimensions")
-        self.paper_dimensions = {
-            'landscape': (11.69, 8.27),
-            'portrait': (8.27, 11.69)
-        }
-        # Open the MUN logo and save it in base64
+        # Changing the paper dimensions of one config doesn't change them for the others
+        self.paper_dimensions = dict(_PAPER_DIMENSIONS)
+
+        # Get the MUN logo in base64. It only gets read from disk once
         logging.info("Saving MUN logo in base64")
-        logging.debug("Opening MUN logo from %s", os.path.dirname(__file__) + '/MUN_Logo_RGB2.png')
-        with open(os.path.dirname(__file__) + '/MUN_Logo_RGB2.png', 'rb') as image_file:
-            encoded_logo = base64.b64encode(image_file.read()).decode()
-        self.MUN_logo = 'data:image/png;base64,' + encoded_logo
+        self.MUN_logo = _load_logo()
 
         # Set up paths to directories
         logging.info("Setting default directories to find indicators, grades and histograms")
-        self.indicators_loc = os.path.dirname(__file__) + '/../Indicators'
-        self.grades_loc = os.path.dirname(__file__) + '/../Grades'
-        self.histograms_loc = os.path.dirname(__file__) + '/../Histograms'
+        self.indicators_loc = _INDICATORS_LOC
+        self.grades_loc = _GRADES_LOC
+        self.histograms_loc = _HISTOGRAMS_LOC
+
+        # Options from the config files that aren't in __slots__
+        self._other_options = dict()
+
+        # Font sizes and their pixel sizes get worked out on first use by font_sizes
+        # and font_px. Any font sizes that get set replace the worked out ones
+        self._font_sizes = None
+        self._font_size_overrides = dict()
+        self._font_px = dict()
+        # Same for the split up header_attribs
+        self._header_keys = None
 
         # Load default config file and set attributes based on its contents
         logging.info("Setting attributes from default.json")
-        default = json.load(open(config_path + '/' + 'default.json'))
-        for key in default:
-            setattr(self, key, default[key])
+        default = _load_json(config_path + '/' + 'default.json')
+        self._set_attributes(default, 'default.json')
 
         # Overwrite default options with the passed in config file if necessary
         if config_file:
-            new_attribs = json.load(open(config_path + '/' + config_file))
+            new_attribs = _load_json(config_path + '/' + config_file)
             logging.info("Overriding attributes using config file %s", config_file)
-            for key in new_attribs:
-                setattr(self, key, new_attribs[key])
-
-        # Set up font sizes and paper dimensions
-        logging.info("Setting up font sizes")
-        self.font_sizes = {
-            'graph_title': self.annotation_font*1.2,
-            'yaxis_title': self.annotation_font,
-            'GA_text': self.annotation_font*1.5,
-            'annotations': self.annotation_font,
-            'axis_labels': int(self.annotation_font/1.2),
-            'barcounts': int(self.annotation_font/1.2),
-            'legend_text': self.annotation_font
-        }
+            self._set_attributes(new_attribs, config_file)
 
         logging.info("ReportConfig initialization complete!")
+
+
+    def _set_attributes(self, attribs, source):
+        """Set config attributes from the contents of a JSON config file
+
+        Options that aren't in __slots__ get kept in _other_options, where __getattr__
+        finds them. The only keys that get skipped are the ones worked out from other
+        options (e.g. header_keys)
+
+        Args:
+            attribs(dict): The parsed JSON file
+            source(string): The name of the file, used for the log messages
+        """
+        for key in attribs:
+            try:
+                setattr(self, key, attribs[key])
+            except AttributeError:
+                if hasattr(ReportConfig, key):
+                    logging.warning("Option %s in config file %s is worked out from other "
+                        "options and can't be set, skipping it", key, source)
+                else:
+                    logging.info("Option %s in config file %s isn't a standard option, "
+                        "keeping it anyway", key, source)
+                    self._other_options[key] = attribs[key]
+
+
+    def __getattr__(self, name):
+        """Look up an option from a config file that isn't one of the standard ones
+
+        Only gets called when name isn't in __slots__ or hasn't been set
+
+        Args:
+            name(string): The name of the option
+
+        Returns:
+            The value of the option from the config file
+
+        Exceptions:
+            AttributeError: Raised if no config file had the option
+        """
+        # _other_options itself ends up here if it hasn't been set yet
+        if not name.startswith('_'):
+            options = self._other_options
+            if name in options:
+                return options[name]
+        raise AttributeError("'{}' object has no attribute '{}'".format(
+            type(self).__name__, name))
+
+
+    @property
+    def font_sizes(self):
+        """A dictionary of font sizes used in the Report, derived from annotation_font
+
+        Only gets built on first use, and again if annotation_font changes. Setting
+        font_sizes (e.g. from a config file) replaces the sizes it has keys for, and
+        the rest still follow annotation_font
+
+        Returns:
+            dict: The font sizes, keyed by their use in the Report
+        """
+        if self._font_sizes is None or self._font_sizes[0] != self.annotation_font:
+            logging.info("Setting up font sizes")
+            sizes = {
+                'graph_title': self.annotation_font*1.2,
+                'yaxis_title': self.annotation_font,
+                'GA_text': self.annotation_font*1.5,
+                'annotations': self.annotation_font,
+                'axis_labels': int(self.annotation_font/1.2),
+                'barcounts': int(self.annotation_font/1.2),
+                'legend_text': self.annotation_font
+            }
+            sizes.update(self._font_size_overrides)
+            self._font_sizes = (self.annotation_font, sizes)
+        return self._font_sizes[1]
+
+
+    @font_sizes.setter
+    def font_sizes(self, sizes):
+        self._font_size_overrides = dict(sizes)
+        self._font_sizes = None
+
+
+    @property
+    def header_keys(self):
+        """The entries of header_attribs, split up and stripped of whitespace
+
+        Only gets split on first use, and again if header_attribs changes
+
+        Returns:
+            tuple(string): The header entries (e.g. ('Graduate Attribute', 'Indicator'))
+        """
+        if self._header_keys is None or self._header_keys[0] != self.header_attribs:
+            self._header_keys = (
+                self.header_attribs,
+                tuple(x.strip() for x in self.header_attribs.split(','))
+            )
+        return self._header_keys[1]
+
+
+    def font_px(self, key):
+        """Get the size of a font in pixels at the configured dpi
+
+        Every Report made with this config shares the results, so each size only
+        gets calculated once per dpi
+
+        Args:
+            key(string): The name of the font in font_sizes (e.g. 'GA_text')
+
+        Returns:
+            int: The font size in pixels
+        """
+        size = self.font_sizes[key]
+        px = self._font_px.get((size, self.dpi))
+        if px is None:
+            px = int(size/100*self.dpi)
+            self._font_px[(size, self.dpi)] = px
+        return px
@@ -2,14 +2,29 @@ from Report import Report
 from ReportConfig import ReportConfig
 from DataStore import DataStore
 import grades_org
+import fast_hist
 import globals
 import textformatting as tf
 import os
 import numpy as np
 import logging
 import re
+import functools
+import contextlib
+import io
 import pandas as pd
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# The ReportGenerator that a worker process renders rows for. Set by _init_worker
+_worker_generator = None
+
+# Directories that _makedirs has already made sure exist
+_made_dirs = set()
+
+# The indicator sheet columns that gen_and_save_histograms reads from a row
+_ROW_FIELDS = ('Course #', 'Method of Assessment', 'Indicator #', 'Level')
 
 
 class ReportGenerator(object):
@@ -74,11 +89,11 @@ class ReportGenerator(object):
 
         # logging.info("Initializing whitelist")
         self.whitelist = whitelist
-        # Ensure that all whitelist entries are lists (if it exists, that is)
+        # Ensure that all whitelist entries are lists (if it exists, that is). The
+        # entries go into a new dict so that the caller's whitelist doesn't get changed
         if self.whitelist:
             logging.debug("Checking whitelist for list validity")
-            for entry in self.whitelist.keys():
-                self.whitelist[entry] = _check_list(self.whitelist[entry])
+            self.whitelist = {entry: _check_list(value) for entry, value in whitelist.items()}
 
                 # if type(self.whitelist[entry]) is not type(list()):
                 #     logging.debug("Whitelist entry %s is not a list. Converting to a one-size list", entry)
@@ -121,6 +136,12 @@ class ReportGenerator(object):
         logging.debug("Grades location is %s", self.config.grades_loc)
         logging.debug("Histograms location is %s", self.config.histograms_loc)
 
+        # Unique term offerings by course number. See _term_offered
+        self._terms_offered = None
+        # Reports waiting to be saved together as (Report, save name). Only worker
+        # processes collect them; everywhere else, Reports get saved right away
+        self._pending_saves = None
+
         # Check to see if a DataStore was passed to init, create one if not
         if not ds:
             logging.debug("No DataStore object was passed to init; creating one now")
@@ -129,13 +150,30 @@ class ReportGenerator(object):
 
         # Make sure that the histograms folder exists
         logging.info("Setting up output directories (Missing Data & Histograms)")
-        os.makedirs(os.path.dirname(__file__) + '/../Missing Data', exist_ok=True)
-        os.makedirs(self.config.histograms_loc, exist_ok=True)
+        _makedirs(os.path.dirname(__file__) + '/../Missing Data')
+        _makedirs(self.config.histograms_loc)
 
         logging.info("ReportGenerator initialization done!")
 
 
-    def _parse_row(self, row, program):
+    def _header_columns(self, columns):
+        """Work out which indicator sheet columns go into each header entry
+
+        Every row of a query has the same columns, so this only needs to be done once
+        per query rather than once per row. See _parse_row for how header_attribs
+        entries get matched to columns
+
+        Args:
+            columns: The column names of the indicator sheet query
+
+        Returns:
+            dict: The header_attribs entries, each mapped to the list of column names
+                that contain it
+        """
+        return {key: [col for col in columns if key in col] for key in self.config.header_keys}
+
+
+    def _parse_row(self, row, program, header_columns=None):
         """Turn a row of a Pandas DataFrame into a dictionary and bin list
 
         The data stored in the master indicator spreadsheets needs to be cleaned up
@@ -151,8 +189,11 @@ class ReportGenerator(object):
         'Course #' and 'Course Description' using a ' - ' character
 
         Args:
-            row(pd.Series): The row of a Pandas DataFrame (so a Pandas Series) to pull data from
+            row: The row of a Pandas DataFrame to pull data from, either as a Pandas
+                Series or as a dict keyed by column name
             program(string): The program that the indicator file row belongs to
+            header_columns(dict): The output of _header_columns for the row's columns.
+                Gets worked out from the row if it isn't passed in
 
         Returns:
             dict: A dictionary containing the indicator information, keyed using instructions
@@ -163,28 +204,27 @@ class ReportGenerator(object):
         # logging.info("Parsing a row from a Pandas DataFrame")
         # Handle the bins first since those are easy
         try:
-            bins = [float(x) for x in row['Bins'].split(',')]
+            # Most rows share the same few bin strings, so the parsed bins are cached.
+            # Each row still gets its own list so that nothing downstream can change
+            # the cached copy
+            bins = list(_parse_bins(row['Bins']))
         except Exception:
             logging.warning("ERROR: Non-number bins encountered in a lookup table")
             return None, None
-        logging.debug("Bins parsed as:\t%s", ', '.join(str(x) for x in bins))
+        if _debug_enabled():
+            logging.debug("Bins parsed as:\t%s", ', '.join(str(x) for x in bins))
 
-        # Convert the comma-separated string into dictionary keys
+        # Find out which columns feed each entry if the caller didn't already
+        if header_columns is None:
+            header_columns = self._header_columns(row.keys())
+
+        # Build a dictionary of indicator information, keyed by the header entries. Each
+        # entry collects the row's values from every column that the key was found in and
+        # glues them together with ' - ' characters
         # logging.info("Creating a dictionary of indicator information")
-        indicator_dict = {i:"" for i in [x.strip() for x in self.config.header_attribs.split(',')]}
-
-        # logging.info("Filling the dictionary with information from the row")
-        for key in indicator_dict.keys():
-            # Look for all occurrences where the key is found in the row's columns
-            # and store that information in a list
-            occurrences = [str(row[i]) for i in row.index if key in i]
-            # Glue all collected data together with ' - ' characters
-            # logging.debug("Indicator entry %s being filled with info from lookup table columns %s",
-            #     key,
-            #     ', '.join(occurrences)
-            # )
-            indicator_dict[key] = ' - '.join(occurrences)
-            # logging.debug("Entry [%s]: %s", key, indicator_dict[key])
+        indicator_dict = {
+            key: ' - '.join([str(row[i]) for i in cols]) for key, cols in header_columns.items()
+        }
         
         # If Program is in indicator_dict, add the program parameter to indicator_dict
         if 'Program' in indicator_dict.keys():
@@ -194,7 +234,7 @@ class ReportGenerator(object):
         return indicator_dict, bins
 
 
-    def start_autogenerate(self):
+    def start_autogenerate(self, max_workers=1):
         """Begin autogeneration of reports
 
         The general procedure goes as follows:
@@ -205,7 +245,18 @@ class ReportGenerator(object):
 
             * Get indicator data from the row
             * Search for grades for the assessment tool
-            * Iterate through each file found and save a histogram
+
+          * Iterate through each file found for each row and save a histogram. The
+            rows are independent of each other, so they can optionally be split up
+            across a pool of worker processes
+
+        Args:
+            max_workers(int): The number of worker processes that render histograms.
+                Defaults to 1, which renders everything in this process without a
+                pool. Pass None to use one worker per CPU
+
+        Exceptions:
+            RuntimeError: Raised if a worker process dies or can't be set up
 
         TODO:
             * Decouple the method
@@ -214,220 +265,375 @@ class ReportGenerator(object):
         """
         logging.info("Beginning report autogeneration")
         logging.debug("Autogenerator set up to use programs %s", ', '.join(self.programs))
-        # Iterate across the list of programs
-        for program in self.programs:
-            logging.info("Generating reports for program %s", program)
-
-            # logging.info("Getting a query list from the program's indicator lookup table")
-            # Query the indicators DataFrame
-            query = self.ds.query_indicators(program=program, dict_of_queries=self.whitelist)
-
-            # Set up a file to store missing data in
-            # logging.info("Starting a file to save missing data")
-            missing_data = open("../Missing Data/{} missing data.txt".format(program), "w+")
-
-            # Iterate across each indicator (each row of the query)
-            # logging.info("Beginning row iteration...")
-            for rownumber, row in query.iterrows():
-                # Skip this row if the "Assessed" column is set to any form of "No" (also check if it's there)
-                if 'Assessed' in row and row['Assessed'].lower() == 'no':
-                    # print("Found a non-assessed indicator")
-                    continue
-
-                # Skip this row if no bins are defined
-                if row['Bins'] in [np.nan, None]:
-                    logging.warning("No bins (and likely no data) found for {} {} {} {}, skipping row".format(
-                        row['Indicator #'], row['Level'], row['Course #'], row['Method of Assessment']
-                    ))
-                    logging.warning("Missing binning stored in separate file")
-                    # Log the missing data entry
-                    missing_data.write("Missing bin ranges for {a} {b} ({c}-{d})\n".format(a=row["Course #"],
-                        b=row["Method of Assessment"], c=row['Indicator #'], d=row['Level']
-                    ))
-                    continue
-                else:
-                    logging.debug("Processing data for {} {} {} {}".format(row['Indicator #'], row['Level'],
-                        row['Course #'], row['Method of Assessment']
-                    ))
-
-                #------------------------------------------------------------------------------
-                # Obtain the necessary indicator data and bins from the row. header_attribs in
-                # ReportConfig determine what gets pulled and what doesn't. These are also 
-                # JSON-loadable. Program gets added to indicator data later if required.
-                #------------------------------------------------------------------------------
-                indicator_data, bins = self._parse_row(row, program)
-                # If no bins were parsed, a histogram cannot be generated. Skip this indicator/row
-                if not bins:
-                    logging.warning("ERROR: No useable bins for {} {} {} {}, skipping row".format(
-                        row['Indicator #'], row['Level'], row['Course #'], row['Method of Assessment']
-                    ))
-                    # Log the missing bins
-                    missing_data.write("No useable bins for {a} {b} ({c}-{d})\n".format(
-                        a=row["Course #"], b=row["Method of Assessment"], c=row['Indicator #'], d=row['Level']
-                    ))
-                    continue
-
-                logging.debug("Indicator data obtained from the row: %s", str(indicator_data))
-
-                #-----------------------------------------------------------------------------
-                # Search for grade files. Store all occurrences of the assessment data so
-                # that a histogram can be generated for each data set.
-                #
-                # Generates a defaultdict like the following example:
-                # {
-                #     "ENCM": [],
-                #     "Core": ["ENGI 1040 Circuits Grade - Core - Custom column names.xlsx"],
-                #     "ECE": ["ENGI 1040 Circuits Grade - ECE - Custom column names.xlsx"]
-                # }
-                # These are stored in lists because the original intention was to allow
-                # multiple assessment files for the same indicator.
-                #-----------------------------------------------------------------------------
-                # Use the config parameter to get the backup subdirectories
-                search_list = [program] + [x.strip() for x in self.config.grade_backup_dirs.split(',')]
-                logging.debug("Beginning search for grade files. Priority: %s", ', '.join(search_list))
+        # Worker processes get forked from this one, so make sure numba won't be
+        # running threads that a fork leaves hanging. Warns if it's too late for that
+        fast_hist.use_fork_safe_threading()
+        # Load every program's indicators up front so that they get read in parallel
+        self.ds.load_indicators(self.programs)
+        # These config values stay the same for every row, so look them up once
+        backup_dirs = [x.strip() for x in self.config.grade_backup_dirs.split(',')]
+        grades_loc = self.config.grades_loc
+        # Rows from every program go to the same pool of worker processes, so the
+        # workers only get started once and one program's rows can be rendered while
+        # the next program is being queued up. Without a pool (max_workers=1), rows
+        # get rendered in this process as they're queued
+        if max_workers == 1:
+            # Start the image export engine once instead of for every histogram
+            Report.prewarm()
+            pool = contextlib.nullcontext()
+        else:
+            pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                initargs=(self,))
+        workers = max_workers or os.cpu_count() or 1
+        with pool as executor:
+            # A worker dying breaks the whole pool, which can show up while rows are
+            # still being queued as well as when their results get collected
+            try:
+                # Iterate across the list of programs
+                queued = [self._queue_program(program, backup_dirs, grades_loc, executor, workers)
+                    for program in self.programs]
+                # Collect the entries of each program's rendered rows as they finish, then
+                # write the program's missing data file in one go, in row order
+                for program, (entries, groups) in zip(self.programs, queued):
+                    rendered = list()
+                    for group in groups:
+                        rendered.extend(group if executor is None else group.result())
+                    with open("../Missing Data/{} missing data.txt".format(program), "w") as missing_file:
+                        missing_file.write(''.join(entry if isinstance(entry, str) else rendered[entry]
+                            for entry in entries))
+            except BrokenProcessPool as exc:
+                raise RuntimeError("A worker process rendering histograms died or could not "
+                    "be started. Run with max_workers=1 to render in this process and see "
+                    "the underlying error") from exc
+
+        logging.info("Autogeneration done!")
 
-                found_grade_files = grades_org.directory_search(
-                    course = row['Course #'],
-                    assessment = row['Method of Assessment'],
-                    main_dir = self.config.grades_loc,
-                    subdirs = search_list
-                )
 
-                # # Check the unique course table to see if the course has a unique term offering
-                # term_offered = None
-                # for _, unique_course in self.ds.unique_courses.iterrows():
-                #     if row['Course #'] == unique_course['Course #']:
-                #         term_offered = unique_course['Term Offered']
-                #         break
-
-                # Run histogram generation and saving
-                self.gen_and_save_histograms(
-                    dirs_and_files=found_grade_files,
-                    dir_priorities = search_list,
-                    indicator_data = indicator_data,
-                    bins = bins,
-                    row = row,
-                    rownum = rownumber,
-                    program = program,
-                    missing_data = missing_data
+    def _queue_program(self, program, backup_dirs, grades_loc, executor=None, workers=1):
+        """Queue up histogram generation for every row of a program's indicator sheet
+
+        See start_autogenerate for the procedure
+
+        Args:
+            program(string): The program to generate histograms for
+            backup_dirs(list(string)): The grades directories to search after the
+                program's own, from the config's grade_backup_dirs
+            grades_loc(string): The directory that the grades directories are in
+            executor(ProcessPoolExecutor): The pool that renders the rows. If it's
+                None, the rows get rendered right away in this process
+            workers(int): The number of worker processes in the pool
+
+        Returns:
+            list: The missing data entries of every row, in row order. The entries of
+                the rows that get rendered aren't known yet, so those rows have the
+                index of their entries in the rendered rows' entries instead
+            list: The rendered rows' entries from _render_rows, in groups of rows
+        """
+        logging.info("Generating reports for program %s", program)
+        # The grade file search order only depends on the program
+        search_list = [program] + backup_dirs
+
+        # logging.info("Getting a query list from the program's indicator lookup table")
+        # Query the indicators DataFrame
+        query = self.ds.query_indicators(program=program, dict_of_queries=self.whitelist)
+        # Skip the rows where the "Assessed" column is set to any form of "No" (also check
+        # if it's there). The column gets lowercased in one go rather than row by row
+        if 'Assessed' in query.columns:
+            query = query[query['Assessed'].str.lower() != 'no']
+        # Match the header entries to the query's columns once for all of its rows
+        header_columns = self._header_columns(query.columns)
+
+        # Collect missing data entries in memory, one for each row. They get written to
+        # the program's missing data file all at once when its rows are done
+        entries = list()
+
+        # Find the rows that have no bins defined with one vectorized null check, and
+        # log them all together before the rows get iterated
+        no_bins = query['Bins'].isna().to_numpy()
+        if no_bins.any():
+            logging.warning("No bins (and likely no data) found for %i rows, skipping them", no_bins.sum())
+            logging.warning("Missing binning stored in separate file")
+
+        # Iterate across each indicator (each row of the query). Rows come out of
+        # itertuples as plain tuples and get zipped into dicts keyed by column name,
+        # which is a lot cheaper than the Series that iterrows builds for every row
+        # logging.info("Beginning row iteration...")
+        columns = list(query.columns)
+        # Rows with bins that can't be used get logged all together after the loop
+        unusable_bins = list()
+        # Arguments to gen_and_save_histograms for every row that gets rendered
+        jobs = list()
+        for rownumber, missing_bins, values in zip(query.index, no_bins,
+                query.itertuples(index=False, name=None)):
+            row = dict(zip(columns, values))
+            # Skip this row if no bins are defined
+            if missing_bins:
+                logging.debug("No bins found for %s %s %s %s", row['Indicator #'], row['Level'],
+                    row['Course #'], row['Method of Assessment']
                 )
+                # Log the missing data entry
+                entries.append("Missing bin ranges for {a} {b} ({c}-{d})\n".format(
+                    a=row["Course #"], b=row["Method of Assessment"], c=row['Indicator #'], d=row['Level']
+                ))
+                continue
+            logging.debug("Processing data for %s %s %s %s", row['Indicator #'], row['Level'],
+                row['Course #'], row['Method of Assessment']
+            )
+
+            #------------------------------------------------------------------------------
+            # Obtain the necessary indicator data and bins from the row. header_attribs in
+            # ReportConfig determine what gets pulled and what doesn't. These are also 
+            # JSON-loadable. Program gets added to indicator data later if required.
+            #------------------------------------------------------------------------------
+            indicator_data, bins = self._parse_row(row, program, header_columns)
+            # If no bins were parsed, a histogram cannot be generated. Skip this indicator/row
+            if not bins:
+                unusable_bins.append("{} {} {} {}".format(
+                    row['Indicator #'], row['Level'], row['Course #'], row['Method of Assessment']
+                ))
+                # Log the missing bins
+                entries.append("No useable bins for {a} {b} ({c}-{d})\n".format(
+                    a=row["Course #"], b=row["Method of Assessment"], c=row['Indicator #'], d=row['Level']
+                ))
+                continue
+
+            logging.debug("Indicator data obtained from the row: %s", indicator_data)
+
+            #-----------------------------------------------------------------------------
+            # Search for grade files. Store all occurrences of the assessment data so
+            # that a histogram can be generated for each data set.
+            #
+            # Generates a defaultdict like the following example:
+            # {
+            #     "ENCM": [],
+            #     "Core": ["ENGI 1040 Circuits Grade - Core - Custom column names.xlsx"],
+            #     "ECE": ["ENGI 1040 Circuits Grade - ECE - Custom column names.xlsx"]
+            # }
+            # These are stored in lists because the original intention was to allow
+            # multiple assessment files for the same indicator.
+            #-----------------------------------------------------------------------------
+            # search_list comes from the program and the config's backup subdirectories
+            if _debug_enabled():
+                logging.debug("Beginning search for grade files. Priority: %s", ', '.join(search_list))
 
+            found_grade_files = grades_org.directory_search(
+                course = row['Course #'],
+                assessment = row['Method of Assessment'],
+                main_dir = grades_loc,
+                subdirs = search_list
+            )
 
+            # # Check the unique course table to see if the course has a unique term offering
+            # term_offered = None
+            # for _, unique_course in self.ds.unique_courses.iterrows():
+            #     if row['Course #'] == unique_course['Course #']:
+            #         term_offered = unique_course['Term Offered']
+            #         break
+
+            # Queue up histogram generation and saving. The row only takes the columns
+            # that gen_and_save_histograms needs, since each job gets sent to a worker.
+            # Its missing data entries go where the row is once they're known
+            entries.append(len(jobs))
+            jobs.append(dict(
+                dirs_and_files=found_grade_files,
+                dir_priorities = search_list,
+                indicator_data = indicator_data,
+                bins = bins,
+                row = {field: row[field] for field in _ROW_FIELDS},
+                rownum = rownumber,
+                program = program
+            ))
+
+
+
+
+
+            # # If the lists are empty, add data entry to missing data file
+            # if not any(found_grade_files[k] for k in found_grade_files.keys()):
+            #     missing_thing = "{a} {b} ({c}-{d})".format(
+            #         a=row["Course #"],
+            #         b=row["Method of Assessment"],
+            #         c=row['Indicator #'],
+            #         d=row['Level']
+            #     )
+            #     logging.warning("No data found for %s", missing_thing)
+            #     missing_data.write("Missing data for {}\n".format(missing_thing))
+            #     #-----------------------------------------------------------------------------
+            #     # Set up the found_grade_files dictionary in a way that the program will
+            #     # recognize as missing data and generate a blank histogram for
+            #     #-----------------------------------------------------------------------------
+            #     found_grade_files = {program: [None]}
+            # else:
+            #     logging.debug("Found files in %s", ', '.join(found_grade_files.keys()))
+
+            # #-----------------------------------------------------------------------------
+            # # Iterate across the list of grade files found and separately generate a
+            # # histogram for each file. Referring to the grade file keys as the location
+            # # at which the grades file was found. Generates a blank histogram in cases
+            # # where no data was found.
+            # #-----------------------------------------------------------------------------
+            # for location in found_grade_files.keys():
+            #     for file in range(0, len(found_grade_files[location])):
+            #         # Provide DataFrame to generate empty histograms if no data is found
+            #         if isinstance(found_grade_files[location][file], type(None)):
+            #             grades = pd.DataFrame({'NO DATA FOUND': [-1]})
+            #         else:   # Open the grades normally
+            #             grades = pd.read_excel("{}/{}/{}".format(
+            #                 self.config.grades_loc,
+            #                 location,
+            #                 found_grade_files[location][file]
+            #                 )
+            #             )
+            #             # Ready the DataFrame for histogramming
+            #             grades = self.ready_DataFrame(
+            #                 grades,
+            #                 course=row['Course #'],
+            #                 term_offered=term_offered
+            #             )
+
+            #         #-----------------------------------------------------------------------------
+            #         # If the program that is being iterated across does not match the folder that
+            #         # the data was found, that should be indicated. The program entry in the
+            #         # header will always be based on which indicator lookup table the information
+            #         # came from. A note gets added to the header information in the case that data
+            #         # does not come from the same thing. Additionally, the program that the
+            #         # indicator belongs to will always get a copy of the file saved to their
+            #         # histgograms directory.
+            #         #-----------------------------------------------------------------------------
+            #         save_copies_to = [program]
+            #         if location != program:
+            #             indicator_data['Note'] = "Using data from {}".format(location)
+            #             logging.debug("Additional copy of this histogram being saved to %s", location)
+            #             save_copies_to.append(location)
+
+            #         # Generate the Report object
+            #         logging.debug("Generating histogram from %s/%s/%s",
+            #             self.config.grades_loc,
+            #             location,
+            #             found_grade_files[location][file]
+            #         )
+            #         report = Report.generate_report(indicator_data, bins, self.config, grades)
+
+            #         #------------------------------------------------------------------------
+            #         # Save the report with a file name reflective of the program, indicator
+            #         # and assessment type to the location that the data came from as well as
+            #         # the program subfolder that the indicator data belongs to. In the case
+            #         # Where multiple grade files were found, add a mumber to the file name.
+            #         #------------------------------------------------------------------------
+            #         # File name formatted string setup
+            #         if len(save_copies_to) > 1:
+            #             # histogram_name = "{pth}/{saveloc}/{prgm} {ind}-{lvl} {crs} {asmt}_{i} {cfg}.pdf"
+
+            #             # File name that reflects row number in indicator sheet and just the indicator
+            #             histogram_name = "{pth}/{saveloc}/{prgm} {row} {ind}-{lvl} datafrom_{dataloc} {cfg}"
+            #         else:
+            #             # histogram_name= "{pth}/{saveloc}/{prgm} {ind}-{lvl} {crs} {asmt} {cfg}.pdf"
+
+            #             # File name that reflects row number in indicator sheet and just the indicator
+            #             histogram_name = "{pth}/{saveloc}/{prgm} {row} {ind}-{lvl} {cfg}"
+
+            #         # Save iteration
+            #         for i in range (0, len(save_copies_to)):
+            #             # File name formatted string formatting
+            #             save_as = histogram_name.format(
+            #                 pth = self.config.histograms_loc,
+            #                 saveloc = save_copies_to[i],
+            #                 prgm = program,
+            #                 ind = row["Indicator #"],
+            #                 lvl = row["Level"][0],
+            #                 crs = row["Course #"],
+            #                 asmt = row["Method of Assessment"],
+            #                 i = i,
+            #                 cfg = self.config.name,
+            #                 # row is rownumber + 2 because Pandas indexes from 0 starting from row 2 in
+            #                 # the original spreadsheet. zfill adds padding zeros
+            #                 row = str(rownumber + 2).zfill(3),
+            #                 dataloc = location
+            #             )
+            #             # Make sure the save directory exists, then save the file
+            #             os.makedirs("{pth}/{key}".format(
+            #                 pth = self.config.histograms_loc,
+            #                 key = save_copies_to[i]
+            #             ),
+            #             exist_ok=True
+            #             )
+            #             report.save(save_as)
+
+        if unusable_bins:
+            logging.warning("ERROR: No useable bins for %i rows of %s, skipped them: %s",
+                len(unusable_bins), program, '; '.join(unusable_bins)
+            )
 
+        # Run histogram generation and saving for all of the program's rows
+        return entries, self._render_rows(jobs, executor, workers)
 
 
-                # # If the lists are empty, add data entry to missing data file
-                # if not any(found_grade_files[k] for k in found_grade_files.keys()):
-                #     missing_thing = "{a} {b} ({c}-{d})".format(
-                #         a=row["Course #"],
-                #         b=row["Method of Assessment"],
-                #         c=row['Indicator #'],
-                #         d=row['Level']
-                #     )
-                #     logging.warning("No data found for %s", missing_thing)
-                #     missing_data.write("Missing data for {}\n".format(missing_thing))
-                #     #-----------------------------------------------------------------------------
-                #     # Set up the found_grade_files dictionary in a way that the program will
-                #     # recognize as missing data and generate a blank histogram for
-                #     #-----------------------------------------------------------------------------
-                #     found_grade_files = {program: [None]}
-                # else:
-                #     logging.debug("Found files in %s", ', '.join(found_grade_files.keys()))
-
-                # #-----------------------------------------------------------------------------
-                # # Iterate across the list of grade files found and separately generate a
-                # # histogram for each file. Referring to the grade file keys as the location
-                # # at which the grades file was found. Generates a blank histogram in cases
-                # # where no data was found.
-                # #-----------------------------------------------------------------------------
-                # for location in found_grade_files.keys():
-                #     for file in range(0, len(found_grade_files[location])):
-                #         # Provide DataFrame to generate empty histograms if no data is found
-                #         if isinstance(found_grade_files[location][file], type(None)):
-                #             grades = pd.DataFrame({'NO DATA FOUND': [-1]})
-                #         else:   # Open the grades normally
-                #             grades = pd.read_excel("{}/{}/{}".format(
-                #                 self.config.grades_loc,
-                #                 location,
-                #                 found_grade_files[location][file]
-                #                 )
-                #             )
-                #             # Ready the DataFrame for histogramming
-                #             grades = self.ready_DataFrame(
-                #                 grades,
-                #                 course=row['Course #'],
-                #                 term_offered=term_offered
-                #             )
-
-                #         #-----------------------------------------------------------------------------
-                #         # If the program that is being iterated across does not match the folder that
-                #         # the data was found, that should be indicated. The program entry in the
-                #         # header will always be based on which indicator lookup table the information
-                #         # came from. A note gets added to the header information in the case that data
-                #         # does not come from the same thing. Additionally, the program that the
-                #         # indicator belongs to will always get a copy of the file saved to their
-                #         # histgograms directory.
-                #         #-----------------------------------------------------------------------------
-                #         save_copies_to = [program]
-                #         if location != program:
-                #             indicator_data['Note'] = "Using data from {}".format(location)
-                #             logging.debug("Additional copy of this histogram being saved to %s", location)
-                #             save_copies_to.append(location)
-
-                #         # Generate the Report object
-                #         logging.debug("Generating histogram from %s/%s/%s",
-                #             self.config.grades_loc,
-                #             location,
-                #             found_grade_files[location][file]
-                #         )
-                #         report = Report.generate_report(indicator_data, bins, self.config, grades)
-
-                #         #------------------------------------------------------------------------
-                #         # Save the report with a file name reflective of the program, indicator
-                #         # and assessment type to the location that the data came from as well as
-                #         # the program subfolder that the indicator data belongs to. In the case
-                #         # Where multiple grade files were found, add a mumber to the file name.
-                #         #------------------------------------------------------------------------
-                #         # File name formatted string setup
-                #         if len(save_copies_to) > 1:
-                #             # histogram_name = "{pth}/{saveloc}/{prgm} {ind}-{lvl} {crs} {asmt}_{i} {cfg}.pdf"
-
-                #             # File name that reflects row number in indicator sheet and just the indicator
-                #             histogram_name = "{pth}/{saveloc}/{prgm} {row} {ind}-{lvl} datafrom_{dataloc} {cfg}"
-                #         else:
-                #             # histogram_name= "{pth}/{saveloc}/{prgm} {ind}-{lvl} {crs} {asmt} {cfg}.pdf"
-
-                #             # File name that reflects row number in indicator sheet and just the indicator
-                #             histogram_name = "{pth}/{saveloc}/{prgm} {row} {ind}-{lvl} {cfg}"
-
-                #         # Save iteration
-                #         for i in range (0, len(save_copies_to)):
-                #             # File name formatted string formatting
-                #             save_as = histogram_name.format(
-                #                 pth = self.config.histograms_loc,
-                #                 saveloc = save_copies_to[i],
-                #                 prgm = program,
-                #                 ind = row["Indicator #"],
-                #                 lvl = row["Level"][0],
-                #                 crs = row["Course #"],
-                #                 asmt = row["Method of Assessment"],
-                #                 i = i,
-                #                 cfg = self.config.name,
-                #                 # row is rownumber + 2 because Pandas indexes from 0 starting from row 2 in
-                #                 # the original spreadsheet. zfill adds padding zeros
-                #                 row = str(rownumber + 2).zfill(3),
-                #                 dataloc = location
-                #             )
-                #             # Make sure the save directory exists, then save the file
-                #             os.makedirs("{pth}/{key}".format(
-                #                 pth = self.config.histograms_loc,
-                #                 key = save_copies_to[i]
-                #             ),
-                #             exist_ok=True
-                #             )
-                #             report.save(save_as)
+    def _render_rows(self, jobs, executor=None, workers=1):
+        """Run gen_and_save_histograms for a list of rows
+
+        Every row reads its own grades files and saves to its own file names, so the
+        rows get split into one group of neighbouring rows per worker process. Each
+        worker saves all of its group's histograms with one call to the export engine.
+        Either way, the rows' missing data entries get returned instead of written, so
+        that they can go in between the other rows' entries
+
+        Args:
+            jobs(list(dict)): The arguments to gen_and_save_histograms for each row,
+                except for missing_data
+            executor(ProcessPoolExecutor): The pool to render the rows in. If it's
+                None, the rows get rendered in this process right away instead
+            workers(int): The number of worker processes in the pool
+
+        Returns:
+            list: The groups of rows, in row order. Each one is a list of the missing
+                data entries of every row in the group. With a pool, each group is a
+                Future with that list as its result instead
+        """
+        if executor is None:
+            return [[self._render_row(job) for job in jobs]]
+        if not jobs:
+            return list()
+
+        logging.info("Rendering %i rows in worker processes", len(jobs))
+        group_size = -(-len(jobs) // workers)
+        return [executor.submit(_gen_and_save_rows, jobs[i:i + group_size])
+            for i in range(0, len(jobs), group_size)]
+
+
+    def _render_row(self, job):
+        """Run gen_and_save_histograms for a row and get its missing data entries
+
+        Args:
+            job(dict): The arguments to gen_and_save_histograms, except for missing_data
+
+        Returns:
+            string: The missing data entries for the row
+        """
+        missing_data = io.StringIO()
+        self.gen_and_save_histograms(missing_data=missing_data, **job)
+        return missing_data.getvalue()
 
-        logging.info("Autogeneration done!")
+
+    def _term_offered(self, course):
+        """Look up a course's unique term offering in the unique course table
+
+        The table gets turned into a dictionary the first time it's needed, so each
+        lookup is a dictionary lookup rather than a scan across the table
+
+        Args:
+            course(string): The course number (e.g. 'ENGI 1040')
+
+        Returns:
+            The course's entry in the 'Term Offered' column, or None if the course
+                doesn't have a unique term offering
+        """
+        if self._terms_offered is None:
+            self._terms_offered = dict()
+            unique_courses = self.ds.unique_courses
+            # If a course is listed more than once, its first entry wins
+            for crs, term in zip(unique_courses['Course #'], unique_courses['Term Offered']):
+                self._terms_offered.setdefault(crs, term)
+        return self._terms_offered.get(course)
 
 
     def ready_DataFrame(self, grades, course, term_offered):
@@ -471,16 +677,18 @@ class ReportGenerator(object):
                 + "Appending column sizes to original column names",
                 course
             )
-            # Uses a list comprehension to append the column's true size to the message
+            # Uses a list comprehension to append the column's true size to the message.
+            # DataFrame.count gets the true size of every column at once
             grades.columns = ["{crs}({sz})".format(
                 crs = entry,
-                sz = grades_org.true_size(grades[entry])
-                ) for entry in grades.columns
+                sz = size
+                ) for entry, size in zip(grades.columns, grades.count().tolist())
             ]
     
         # If a cohort filter is in place, take the columns that have the correct cohort(s)
         if self.cohorts is not None:
-            logging.debug("Detected a cohort filter for cohorts %s", ', '.join([str(c) for c in self.cohorts]))
+            if _debug_enabled():
+                logging.debug("Detected a cohort filter for cohorts %s", ', '.join([str(c) for c in self.cohorts]))
             # Start a list to append relevant DataFrame columns to
             new_grades_cols = []
             # Iterate across each cohort requested
@@ -491,10 +699,10 @@ class ReportGenerator(object):
                     if str(c) in col:
                         new_grades_cols.append(grades[col])
                         occurrences += 1
-                        logging.debug("Matched cohort %s with column %s", str(c), col)
+                        logging.debug("Matched cohort %s with column %s", c, col)
                 # If no matching columns are found, append an NDA column
                 if occurrences is 0:
-                    logging.warning("No grades columns were matched to cohort %s", str(c))
+                    logging.warning("No grades columns were matched to cohort %s", c)
                     new_grades_cols.append(pd.Series([-1], name="Co{}: NDA".format(str(c))))
             # Create a new DataFrame by concetenating all columns
             grades = pd.concat(new_grades_cols, axis=1, keys = [s.name for s in new_grades_cols])
@@ -520,10 +728,12 @@ class ReportGenerator(object):
                 The method will pull other required items from here such as Program,
                 Course Number, etc.
             bins(list(int or float)): The bins for generating Report objects
-            row(pd.Series): The row that the program got all of this indicator data from
+            row: The row that the program got all of this indicator data from, as a
+                dict keyed by column name (or a Pandas Series). Only the columns in
+                _ROW_FIELDS get used
             rownum(int): The row number that all of this indicator data is coming from
             program(string): The program that all of this indicator data belongs to
-            missing_data: The missing data file
+            missing_data: Where to write missing data entries, such as an io.StringIO
 
         Examples:
             dirs_and_files comes in like this (and dir_priorities is in the same order
@@ -591,8 +801,8 @@ class ReportGenerator(object):
                   found
         """
         logging.info("Preparing to save and generate a list of histograms")
-        logging.debug("dirs_and_files is %s", str(dirs_and_files))
-        logging.debug("dir_priorities is %s", str(dir_priorities))
+        logging.debug("dirs_and_files is %s", dirs_and_files)
+        logging.debug("dir_priorities is %s", dir_priorities)
 
         # Keep track of the number of locations that come up empty
         empty_locations = 0
@@ -603,12 +813,20 @@ class ReportGenerator(object):
             save_extra_to = dir_priorities[0]
         
         # Check the unique course table to see if the course has a unique term offering
-        term_offered = None
-        for _, unique_course in self.ds.unique_courses.iterrows():
-            if row['Course #'] == unique_course['Course #']:
-                term_offered = unique_course['Term Offered']
-                logging.info("Course %s came up with unique term_offered %s", row['Course #'], str(term_offered))
-                break
+        term_offered = self._term_offered(row['Course #'])
+        if term_offered is not None:
+            logging.info("Course %s came up with unique term_offered %s", row['Course #'], term_offered)
+
+        # Every file name for this row starts the same way, so build that part once.
+        # row is rownumber + 2 because Pandas indexes from 0 starting from row 2 in
+        # the original spreadsheet. zfill adds padding zeros
+        name_start = "{program} {row} {ind}-{lvl}".format(
+            program = program,
+            row = str(rownum + 2).zfill(3),
+            ind = row["Indicator #"],
+            lvl = row["Level"][0]
+        )
+        cfg = self.config.name
 
         for dir in dir_priorities:
             logging.debug("Generating histograms from dir %s", dir)
@@ -620,53 +838,39 @@ class ReportGenerator(object):
                 # If the dir does not match the program that the indicator belongs to, indicate that
                 if dir != program:
                     indicator_data['Notes'] = "Using data from {}".format(dir)
+                # The histogram directories are the same for every file in the dir
+                save_dir = "{}/{}".format(self.config.histograms_loc, dir)
+                extra_dir = "{}/{}".format(self.config.histograms_loc, save_extra_to)
 
-                for file in dirs_and_files[dir]:    # For each grades file in the specified dir
+                numbered = len(dirs_and_files[dir]) > 1
+                for i, file in enumerate(dirs_and_files[dir]):    # For each grades file in the specified dir
                     # Open the grades file
-                    logging.debug("Reading file %s", "{}/{}/{}".format(self.config.grades_loc, dir, file))
-                    grades = pd.read_excel("{}/{}/{}".format(self.config.grades_loc, dir, file))
+                    grades_file = "{}/{}/{}".format(self.config.grades_loc, dir, file)
+                    logging.debug("Reading file %s", grades_file)
+                    grades = grades_org.read_grades(grades_file)
                     # Ready the DataFrame for histogramming
                     grades = self.ready_DataFrame(grades, course=row['Course #'], term_offered=term_offered)
 
                     # Generate a Report object
                     rprt = Report.generate_report(indicator_data, bins, self.config, grades)
 
+                    # File name format if the list of files is longer than one
+                    if numbered:
+                        save_name = "{}_{} {}".format(name_start, i, cfg)
                     # File name format if the list of files is only one long
-                    if len(dirs_and_files[dir]) == 1:
-                        histogram_name = "{program} {row} {ind}-{lvl} {cfg}"
-                    # File name format if the list of files is longer
                     else:
-                        histogram_name = "{program} {row} {ind}-{lvl}_{i} {cfg}"
+                        save_name = "{} {}".format(name_start, cfg)
                     
                     # Save the Report to the current directory
-                    save_name = histogram_name.format(
-                        program = program,
-                        ind = row["Indicator #"],
-                        lvl = row["Level"][0],
-                        i = dirs_and_files[dir].index(file),
-                        cfg = self.config.name,
-                        # row is rownumber + 2 because Pandas indexes from 0 starting from row 2 in
-                        # the original spreadsheet. zfill adds padding zeros
-                        row = str(rownum + 2).zfill(3)
-                    )
-                    # Make sure the save directory exists, then save the file
-                    os.makedirs("{path}/{dir}".format(path=self.config.histograms_loc, dir=dir), exist_ok=True)
-                    rprt.save("{path}/{dir}/{name}".format(
-                        path = self.config.histograms_loc,
-                        dir = dir,
-                        name = save_name
-                        )
-                    )
+                    # Make sure the save directory exists, then save the file. Each
+                    # directory only gets checked once
+                    _makedirs(save_dir)
+                    self._save_report(rprt, "{}/{}".format(save_dir, save_name))
 
                     # If the extra save location was specified, save a copy there
                     if save_extra_to:
-                        os.makedirs("{path}/{dir}".format(path=self.config.histograms_loc, dir=program), exist_ok=True)
-                        rprt.save("{path}/{dir}/{name}".format(
-                            path = self.config.histograms_loc,
-                            dir = save_extra_to,
-                            name = save_name
-                            )
-                        )
+                        _makedirs(extra_dir)
+                        self._save_report(rprt, "{}/{}".format(extra_dir, save_name))
                 # Set the extra save location back to an empty string to prevent further saving
                 # Happens outside of the "files in directory" for-loop so that the extra location
                 # gets copies of every file that matches the criteria. To prevent that behaviour,
@@ -692,35 +896,27 @@ class ReportGenerator(object):
             rprt = Report.generate_report(indicator_data, bins, self.config, grades)
 
             # Set up file name
-            histogram_name = "{program} {row} {ind}-{lvl} {cfg} NDA"
-            save_name = histogram_name.format(
-                program = program,
-                ind = row["Indicator #"],
-                lvl = row["Level"][0],
-                cfg = self.config.name,
-                # row is rownumber + 2 because Pandas indexes from 0 starting from row 2 in
-                # the original spreadsheet. zfill adds padding zeros
-                row = str(rownum + 2).zfill(3)
-            )
+            save_name = "{} {} NDA".format(name_start, cfg)
 
-            # Check to see that the directory exists
-            os.makedirs("{path}/{dir}".format(path=self.config.histograms_loc, dir=program), exist_ok=True)
-            rprt.save("{path}/{dir}/{name}".format(
-                path = self.config.histograms_loc,
-                dir = program,
-                name = save_name
-                )
-            )
+            # Check to see that the directory exists, then save histogram to program directory
+            save_dir = "{}/{}".format(self.config.histograms_loc, program)
+            _makedirs(save_dir)
+            self._save_report(rprt, "{}/{}".format(save_dir, save_name))
 
-            # Save histogram to program directory
-            rprt.save("{path}/{dir}/{name}".format(
-                path = self.config.histograms_loc,
-                dir = program,
-                name = save_name
-                )
-            )
+        logging.info("Finished generating histograms for row %s of %s indicators", rownum, program)
 
-        logging.info("Finished generating histograms for row %s of %s indicators", str(rownum), str(program))
+
+    def _save_report(self, rprt, savename):
+        """Save a Report, or hold on to it if Reports are being saved together
+
+        Args:
+            rprt(Report): The Report to save
+            savename(string): The save file name
+        """
+        if self._pending_saves is None:
+            rprt.save(savename)
+        else:
+            self._pending_saves.append((rprt, savename))
 
 
     @staticmethod
@@ -736,6 +932,93 @@ class ReportGenerator(object):
         pass
 
 
+def _debug_enabled():
+    """Check if debug messages are being logged
+
+    Used to skip building debug messages that take some work, like joining lists,
+    when they would just get thrown away
+
+    Returns:
+        bool: True if the root logger handles debug messages
+    """
+    return logging.getLogger().isEnabledFor(logging.DEBUG)
+
+
+def _makedirs(path):
+    """Make sure that a directory exists, only checking once per process
+
+    Args:
+        path(string): The directory
+    """
+    if path not in _made_dirs:
+        os.makedirs(path, exist_ok=True)
+        _made_dirs.add(path)
+
+
+def _init_worker(generator):
+    """Set up a worker process to render rows for a ReportGenerator
+
+    Also starts the image export engine, so that it's running by the time the
+    worker's first group of rows is ready to be saved
+
+    Args:
+        generator(ReportGenerator): The generator that the rows come from
+    """
+    global _worker_generator
+    _worker_generator = generator
+    Report.prewarm()
+
+
+def _gen_and_save_rows(jobs):
+    """Generate and save the histograms for a group of rows in a worker process
+
+    The Reports get collected while the rows are generated, then all get saved with
+    a single Report.save_batch call
+
+    Args:
+        jobs(list(dict)): The arguments to gen_and_save_histograms for each row, except
+            for missing_data
+
+    Returns:
+        list(string): The missing data entries for each row
+    """
+    generator = _worker_generator
+    generator._pending_saves = list()
+    entries = list()
+    try:
+        for job in jobs:
+            entries.append(generator._render_row(job))
+        if generator._pending_saves:
+            reports, savenames = zip(*generator._pending_saves)
+            Report.save_batch(list(reports), list(savenames))
+    finally:
+        generator._pending_saves = None
+    return entries
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_bins(bins):
+    """Convert a comma-separated bins string from an indicator sheet to floats
+
+    Cached, since the same bin strings come up over and over again in the indicator
+    sheets. Strings that can't be converted raise an error every time and don't get
+    cached
+
+    Args:
+        bins(string): The comma-separated bins (e.g. '55, 65, 80, 100')
+
+    Returns:
+        tuple(float): The bins as floats
+
+    Exceptions:
+        ValueError: Raises an error if any of the bins is not a number
+        AttributeError: Raises an error if bins is not a string
+    """
+    # NumPy converts all of the pieces to floats in one C loop, and rejects anything
+    # float() would reject
+    return tuple(np.array(bins.split(','), dtype=np.float64).tolist())
+
+
 def _check_list(var):
     """Check a variable to see if it's a list and convert to a list if it's not
 
@@ -749,6 +1032,6 @@ def _check_list(var):
         var if var was a list, [var] if var was not a list
     """
     if not isinstance(var, list):
-        logging.debug("Variable %s was not a list. Converting to one-size list now...", str(var))
+        logging.debug("Variable %s was not a list. Converting to one-size list now...", var)
         var = [var]
     return var
@@ -0,0 +1,64 @@
+"""pytest configuration for the Tests folder
+
+Some of the older test scripts run as soon as they are imported and need the real
+Indicators and Grades folders (or functions that have since been renamed), so pytest
+is told not to collect them. They can still be run on their own with python
+
+Also has the fixtures that are shared between test files
+"""
+
+import json
+import sys
+import types
+
+import plotly.io._kaleido
+import pytest
+
+
+collect_ignore = [
+    'find_grades_file_test.py',
+    'test_ReportGenerator.py',
+    'test_plotbycohort.py',
+]
+
+
+def _render(fig, opts):
+    return json.dumps([fig, opts], sort_keys=True).encode('utf-8')
+
+
+@pytest.fixture
+def fake_kaleido(monkeypatch):
+    """Replace kaleido with a stand-in that writes out what it was asked to render
+
+    The "image" is the figure and the export options that Plotly handed to kaleido,
+    as JSON. The stand-in also counts how many times its sync server gets started
+    """
+    kaleido = types.ModuleType('kaleido')
+    errors = types.ModuleType('kaleido.errors')
+    errors.ChromeNotFoundError = type('ChromeNotFoundError', (Exception,), {})
+    kaleido.errors = errors
+    kaleido.servers_started = 0
+
+    def calc_fig_sync(fig, opts, topojson=None, kopts=None):
+        return _render(fig, opts)
+
+    def write_fig_from_object_sync(specs, kopts=None):
+        for spec in specs:
+            with open(str(spec['path']), 'wb') as image_file:
+                image_file.write(_render(spec['fig'], spec['opts']))
+
+    def start_sync_server(*args, silence_warnings=False, **kwargs):
+        kaleido.servers_started += 1
+
+    def stop_sync_server(silence_warnings=False):
+        pass
+
+    kaleido.calc_fig_sync = calc_fig_sync
+    kaleido.write_fig_from_object_sync = write_fig_from_object_sync
+    kaleido.start_sync_server = start_sync_server
+    kaleido.stop_sync_server = stop_sync_server
+    monkeypatch.setitem(sys.modules, 'kaleido', kaleido)
+    monkeypatch.setitem(sys.modules, 'kaleido.errors', errors)
+    monkeypatch.setattr(plotly.io._kaleido, 'kaleido', kaleido)
+    monkeypatch.setattr(plotly.io._kaleido, '_KALEIDO_AVAILABLE', True)
+    return kaleido
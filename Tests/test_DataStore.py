@@ -0,0 +1,221 @@
+"""Tests for reading sheets and querying indicators with DataStore
+
+Every test builds its own small indicator sheet in a temporary folder, so none of them
+need the real Indicators folder
+"""
+
+# Temp import for testing
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+
+import openpyxl
+import pandas as pd
+import pytest
+
+import DataStore
+
+
+INDICATORS = pd.DataFrame({
+    'Graduate Attribute': ['KB', 'KB', 'PA', 'PA', 'DE', 'KB'],
+    'Indicator #': ['KB.1', 'KB.2', 'PA.1', 'PA.2', 'DE.1', 'KB.3'],
+    'Level': ['I', 'D', 'A', 'I', 'D', 'A'],
+    'Course #': ['ENGI 3821', 'ENGI 1040', 'ENGI 9999', 'ENGI 3821', 'ENGI 3821', 'ENGI 1040'],
+    'Method of Assessment': ['Final Exam', 'Midterm', 'Lab', 'Final Exam', 'Final Exam', 'Lab'],
+    'Bins': ['55, 65, 80, 100', '50,60,70,80,100', '55, 65, 80, 100', None, 'a,b', None],
+})
+
+
+@pytest.fixture
+def ds(tmp_path, monkeypatch):
+    """A DataStore for the ENCV program, set up in a temporary folder"""
+    monkeypatch.setattr(DataStore, '_PARENT_DIR', str(tmp_path))
+    monkeypatch.setattr(DataStore, '_CACHE_DIR', str(tmp_path / '.cache'))
+    (tmp_path / 'Indicators').mkdir()
+    INDICATORS.to_excel(tmp_path / 'Indicators' / 'ENCV Indicators.xlsx', index=False)
+    pd.DataFrame({'Course #': ['ENGI 1040'], 'Term Offered': [1]}).to_excel(
+        tmp_path / 'Unique Courses.xlsx', index=False)
+    return DataStore.DataStore(programs=['ENCV'], indicators_loc=str(tmp_path / 'Indicators'),
+        grades_loc=str(tmp_path / 'Grades'))
+
+
+def test_read_excel_matches_pandas(tmp_path):
+    # Duplicate and blank headers, a blank row and a formatted but empty cell
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['A', 'A', None, 'B'])
+    ws.append([1, 2, 3, 4])
+    ws.append([])
+    ws.append(['x', None, None, 'y'])
+    ws['H10'].font = openpyxl.styles.Font(bold=True)
+    path = str(tmp_path / 'sheet.xlsx')
+    wb.save(path)
+
+    pd.testing.assert_frame_equal(DataStore._read_excel(path), pd.read_excel(path))
+    pd.testing.assert_frame_equal(DataStore._read_excel(path, dtype=str),
+        pd.read_excel(path, dtype=str))
+
+
+def test_load_indicators_lazily(ds):
+    assert ds.indicators == dict()
+    table = ds.query_indicators('ENCV')
+    assert list(table['Indicator #']) == list(INDICATORS['Indicator #'])
+    assert 'ENCV' in ds.indicators
+
+
+def test_missing_program(ds):
+    with pytest.raises(FileNotFoundError):
+        ds.query_indicators('ENEL')
+    # load_indicators skips programs without a file instead
+    ds.load_indicators(['ENEL', 'ENCV'])
+    assert list(ds.indicators) == ['ENCV']
+
+
+@pytest.mark.parametrize('queries, expected', [
+    ({'indicator': ['KB']}, ['KB.1', 'KB.2', 'KB.3']),
+    ({'Indicator': ['KB'], 'level': ['A']}, ['KB.3']),
+    ({'course': ['ENGI 3821'], 'method': ['Final Exam']}, ['KB.1', 'PA.2', 'DE.1']),
+    ({'indicator': ['KB.1', 'PA']}, ['KB.1', 'PA.1', 'PA.2']),
+    ({'indicator': [r'KB\.[23]', '^DE']}, ['KB.2', 'DE.1', 'KB.3']),
+    ({'bins': ['100']}, ['KB.1', 'KB.2', 'PA.1']),
+    ({'indicator': ['XX']}, []),
+])
+def test_query_indicators(ds, queries, expected):
+    assert list(ds.query_indicators('ENCV', queries)['Indicator #']) == expected
+
+
+@pytest.mark.skipif(DataStore.ahocorasick is None, reason="pyahocorasick is not installed")
+def test_query_without_ahocorasick(ds, monkeypatch):
+    queries = {'indicator': ['KB.1', 'PA', 'DE']}
+    with_automaton = ds.query_indicators('ENCV', queries)
+    ds._query_cache.clear()
+    monkeypatch.setattr(DataStore, 'ahocorasick', None)
+    pd.testing.assert_frame_equal(ds.query_indicators('ENCV', queries), with_automaton)
+
+
+def test_query_bad_key(ds):
+    with pytest.raises(KeyError, match='colour'):
+        ds.query_indicators('ENCV', {'colour': ['red']})
+
+
+def test_query_cache_returns_copies(ds):
+    queries = {'indicator': ['KB']}
+    first = ds.query_indicators('ENCV', queries)
+    first.loc[first.index[0], 'Level'] = 'A'
+    second = ds.query_indicators('ENCV', queries)
+    assert second is not first
+    assert list(second['Level']) == ['I', 'D', 'A']
+    assert len(ds._query_cache) == 1
+
+
+def test_query_without_queries_returns_copies(ds):
+    for queries in [None, dict()]:
+        first = ds.query_indicators('ENCV', queries)
+        first.loc[first.index[0], 'Level'] = 'D'
+        first.drop(columns='Bins', inplace=True)
+        second = ds.query_indicators('ENCV', queries)
+        assert second is not first
+        assert list(second['Level']) == list(INDICATORS['Level'])
+        assert 'Bins' in second.columns
+    # Later queries see the original table too
+    assert list(ds.query_indicators('ENCV', {'level': ['D']})['Indicator #']) == ['KB.2', 'DE.1']
+
+
+def test_query_cache_is_bounded(ds, monkeypatch):
+    monkeypatch.setattr(DataStore, '_QUERY_CACHE_SIZE', 2)
+    for term in ['KB', 'PA', 'KB', 'DE']:
+        ds.query_indicators('ENCV', {'indicator': [term]})
+    # PA was the least recently used query when DE was added
+    assert [key[1] for key in ds._query_cache] == [
+        frozenset({('indicator', ('KB',))}), frozenset({('indicator', ('DE',))})]
+
+
+def test_query_cache_follows_new_indicators(ds):
+    queries = {'indicator': ['KB']}
+    assert len(ds.query_indicators('ENCV', queries).index) == 3
+    ds.indicators['ENCV'] = ds.indicators['ENCV'].iloc[:1]
+    assert len(ds.query_indicators('ENCV', queries).index) == 1
+
+
+def test_cache_prefix_includes_dtype(tmp_path):
+    path = str(tmp_path / 'sheet.xlsx')
+    assert DataStore._cache_prefix(path, str) == DataStore._cache_prefix(path, str)
+    assert len({DataStore._cache_prefix(path, dtype)
+        for dtype in [None, str, object, {'a': str}]}) == 4
+    other = str(tmp_path / 'other' / 'sheet.xlsx')
+    assert DataStore._cache_prefix(path, str) != DataStore._cache_prefix(other, str)
+
+
+@pytest.fixture
+def parquet(monkeypatch):
+    """Stands in for pyarrow's Parquet files with pickles, and gives back empty cells in
+    text columns as None the way pyarrow does"""
+    def to_parquet(df, path, engine=None):
+        df.to_pickle(path)
+    def read_parquet(path, engine=None):
+        df = pd.read_pickle(path)
+        text = df.select_dtypes(include=['object', 'string']).columns
+        df[text] = df[text].astype(object).where(df[text].notna(), None)
+        return df
+    monkeypatch.setattr(DataStore, 'pyarrow', object())
+    monkeypatch.setattr(pd.DataFrame, 'to_parquet', to_parquet)
+    monkeypatch.setattr(pd, 'read_parquet', read_parquet)
+
+
+def test_load_sheet_cache_per_dtype(tmp_path, monkeypatch, parquet):
+    monkeypatch.setattr(DataStore, '_CACHE_DIR', str(tmp_path / '.cache'))
+    path = str(tmp_path / 'sheet.xlsx')
+    pd.DataFrame({'a': [1, None, 3], 'b': ['x', None, 'z']}).to_excel(path, index=False)
+    for _ in range(2):
+        as_text = DataStore._load_sheet(path, dtype=str)
+        as_is = DataStore._load_sheet(path)
+        # Copies were saved for both types, and neither load picked up the other's
+        assert len(os.listdir(tmp_path / '.cache')) == 2
+        assert list(as_text['a'].dropna()) == ['1', '3']
+        assert list(as_is['a'].dropna()) == [1, 3]
+        # Empty cells come back the same as from the Excel file
+        assert as_text['b'].isna().sum() == 1
+        assert as_text['b'][1] is not None
+        assert as_is['b'][1] is not None
+
+
+@pytest.mark.skipif(DataStore.pyarrow is None, reason="pyarrow is not installed")
+def test_load_sheet_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(DataStore, '_CACHE_DIR', str(tmp_path / '.cache'))
+    path = str(tmp_path / 'sheet.xlsx')
+    pd.DataFrame({'a': ['1', '2']}).to_excel(path, index=False)
+    first = DataStore._load_sheet(path, dtype=str)
+    assert len(os.listdir(tmp_path / '.cache')) == 1
+    pd.testing.assert_frame_equal(DataStore._load_sheet(path, dtype=str), first)
+
+    # Restoring an older file with an older modified time still replaces the copy
+    pd.DataFrame({'a': ['3']}).to_excel(path, index=False)
+    os.utime(path, ns=(10**9, 10**9))
+    assert list(DataStore._load_sheet(path, dtype=str)['a']) == ['3']
+    assert len(os.listdir(tmp_path / '.cache')) == 1
+
+
+# pandas 3 warns when str columns only get picked up as object columns, since they
+# won't be after the deprecation
+@pytest.mark.filterwarnings('error')
+def test_indicator_column_types(ds):
+    # Twice as many rows, so that the repeated values make up less than half of them
+    table = pd.concat([INDICATORS, INDICATORS], ignore_index=True)
+    table['Indicator #'] = ['{}.{}'.format(ind, i) for i, ind in enumerate(table['Indicator #'])]
+    table['Indicator Description'] = [None] + ['d{}'.format(i) for i in range(1, 12)]
+    table.to_excel(os.path.join(ds.indicators_loc, 'ENEL Indicators.xlsx'), index=False)
+    table = ds.query_indicators('ENEL')
+
+    # Columns with few distinct values become categories
+    for column in ['Graduate Attribute', 'Level', 'Course #', 'Method of Assessment', 'Bins']:
+        assert isinstance(table[column].dtype, pd.CategoricalDtype), column
+    assert table['Bins'].isna().sum() == 4
+    # Mostly unique columns stay as text. Without empty cells, they get stored as Arrow
+    # strings when pyarrow is installed
+    for column in ['Indicator #', 'Indicator Description']:
+        assert not isinstance(table[column].dtype, pd.CategoricalDtype), column
+        assert pd.api.types.is_string_dtype(table[column]), column
+    if DataStore._ARROW_STRING is not None:
+        assert table['Indicator #'].dtype == DataStore._ARROW_STRING
+        assert table['Indicator Description'].dtype != DataStore._ARROW_STRING
+    assert table['Indicator Description'].isna().sum() == 1
@@ -0,0 +1,111 @@
+"""Tests for saving Reports one at a time and in batches
+
+kaleido (and the Chrome it drives) usually isn't installed where the tests run, so most
+tests use the fake_kaleido fixture from conftest.py. It still goes through all of
+Plotly's own handling in pio.to_image and pio.write_images, so a difference in what the
+two save paths hand to kaleido shows up as a difference in the files
+"""
+
+# Temp import for testing
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+
+import importlib.util
+import json
+
+import pandas as pd
+import pytest
+
+import Report as report_module
+from Report import Report
+from ReportConfig import ReportConfig
+
+
+def _reports():
+    """Build a few Reports with different data, titles and configs"""
+    indicator = {
+        'Program': 'ENEL', 'Course #': 'ENGI 3821', 'Method of Assessment': 'Final Exam',
+        'Graduate Attribute': 'KB', 'Indicator #': 'KB.1', 'Level': 'I',
+        'Indicator Description': 'Knowledge of circuits', 'Course Description': 'Circuits',
+    }
+    reports = list()
+    for config_file, grades, title in [
+        (None, pd.DataFrame({'CO2020': [50, 60, 70, 90]}), '2020'),
+        (None, pd.DataFrame({'CO2020': [50, 60, 70, 90], 'CO2021': [45, 85, 99, None]}), ''),
+        ('by_cohort.json', pd.DataFrame({'CO2021': [10, 75, 80]}), '2021'),
+    ]:
+        report = Report.generate_report(indicator, [55, 65, 80, 100],
+            ReportConfig(config_file), grades)
+        report.add_title(title)
+        reports.append(report)
+    return reports
+
+
+def _read(path):
+    with open(path, 'rb') as image_file:
+        return image_file.read()
+
+
+@pytest.mark.parametrize('format', [None, 'png', 'svg'])
+def test_save_batch_matches_save(tmp_path, fake_kaleido, format):
+    reports = _reports()
+    singles = [str(tmp_path / 'single_{}'.format(i)) for i in range(len(reports))]
+    batched = [str(tmp_path / 'batch_{}'.format(i)) for i in range(len(reports))]
+    for report, savename in zip(reports, singles):
+        report.save(savename, format)
+    Report.save_batch(reports, batched, format)
+
+    for report, single, batch in zip(reports, singles, batched):
+        extension = '.' + (format or report.config.format)
+        assert _read(single + extension) == _read(batch + extension)
+
+
+def test_save_batch_uses_layout_size(tmp_path, fake_kaleido):
+    report = _reports()[0]
+    Report.save_batch([report], [str(tmp_path / 'report')], 'png')
+    fig, opts = json.loads(_read(str(tmp_path / 'report.png')).decode('utf-8'))
+    assert (opts['width'], opts['height']) == (
+        fig['layout']['width'], fig['layout']['height'])
+
+
+def test_save_batch_needs_a_name_per_report(tmp_path):
+    with pytest.raises(ValueError):
+        Report.save_batch(_reports(), [str(tmp_path / 'report')])
+
+
+@pytest.mark.skipif(importlib.util.find_spec('kaleido') is None,
+    reason="kaleido is not installed")
+def test_save_batch_matches_save_with_kaleido(tmp_path):
+    reports = _reports()[:2]
+    for i, report in enumerate(reports):
+        report.save(str(tmp_path / 'single_{}'.format(i)), 'png')
+    Report.save_batch(reports, [str(tmp_path / 'batch_{}'.format(i)) for i in range(2)], 'png')
+    for i in range(2):
+        assert _read(str(tmp_path / 'single_{}.png'.format(i))) == \
+            _read(str(tmp_path / 'batch_{}.png'.format(i)))
+
+
+def test_prewarm_starts_one_server(fake_kaleido, monkeypatch):
+    monkeypatch.setattr(report_module, '_export_server_pid', None)
+    stops = list()
+    monkeypatch.setattr(report_module.atexit, 'register',
+        lambda func, **kwargs: stops.append(func))
+    assert Report.prewarm()
+    assert Report.prewarm()
+    assert fake_kaleido.servers_started == 1
+    assert stops == [fake_kaleido.stop_sync_server]
+
+
+def test_prewarm_restarts_after_fork(fake_kaleido, monkeypatch):
+    # A pid that isn't this process's stands in for a server started before a fork
+    monkeypatch.setattr(report_module, '_export_server_pid', -1)
+    monkeypatch.setattr(report_module.atexit, 'register', lambda func, **kwargs: None)
+    assert Report.prewarm()
+    assert fake_kaleido.servers_started == 1
+
+
+def test_prewarm_without_sync_server(fake_kaleido, monkeypatch):
+    monkeypatch.setattr(report_module, '_export_server_pid', None)
+    monkeypatch.delattr(fake_kaleido, 'start_sync_server')
+    assert not Report.prewarm()
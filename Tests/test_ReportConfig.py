@@ -0,0 +1,128 @@
+"""Tests for loading ReportConfig options from the JSON config files"""
+
+# Temp import for testing
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+
+import json
+import shutil
+
+import pytest
+
+import ReportConfig as rc
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    """A copy of the config folder that the tests can add files to"""
+    path = tmp_path / 'config'
+    shutil.copytree(rc._CONFIG_DIR, str(path))
+    return path
+
+
+def _write_config(config_path, name, options):
+    with open(str(config_path / name), 'w') as config_file:
+        json.dump(options, config_file)
+
+
+def test_defaults_round_trip(config_path):
+    with open(str(config_path / 'default.json')) as default_file:
+        default = json.load(default_file)
+    config = rc.ReportConfig(config_path=str(config_path))
+    for key, value in default.items():
+        assert getattr(config, key) == value
+    assert config.MUN_logo.startswith('data:image/png;base64,')
+    assert config.grades_loc == rc._GRADES_LOC
+
+
+@pytest.mark.parametrize('name', sorted(os.listdir(rc._CONFIG_DIR)))
+def test_shipped_configs_override_defaults(name):
+    config = rc.ReportConfig(name)
+    with open(os.path.join(rc._CONFIG_DIR, name)) as config_file:
+        for key, value in json.load(config_file).items():
+            assert getattr(config, key) == value
+
+
+def test_config_file_overrides(config_path):
+    _write_config(config_path, 'custom.json', {'dpi': 300, 'name': 'Custom'})
+    config = rc.ReportConfig('custom.json', config_path=str(config_path))
+    assert config.dpi == 300
+    assert config.name == 'Custom'
+    # Anything the file leaves out comes from default.json
+    assert config.format == rc.ReportConfig(config_path=str(config_path)).format
+
+
+def test_unknown_options_are_kept(config_path):
+    _write_config(config_path, 'custom.json', {'some_new_option': [1, 2]})
+    config = rc.ReportConfig('custom.json', config_path=str(config_path))
+    assert config.some_new_option == [1, 2]
+    # They don't give configs a __dict__ back
+    assert not hasattr(config, '__dict__')
+    with pytest.raises(AttributeError, match='another_option'):
+        config.another_option
+    assert not hasattr(rc.ReportConfig(config_path=str(config_path)), 'some_new_option')
+
+
+def test_shipped_options_have_slots():
+    for name in os.listdir(rc._CONFIG_DIR):
+        with open(os.path.join(rc._CONFIG_DIR, name)) as config_file:
+            for key in json.load(config_file):
+                assert key in rc.ReportConfig.__slots__, (name, key)
+
+
+def test_derived_options_are_skipped(config_path, caplog):
+    _write_config(config_path, 'custom.json', {'header_keys': 'A'})
+    config = rc.ReportConfig('custom.json', config_path=str(config_path))
+    assert config.header_keys == tuple(x.strip() for x in config.header_attribs.split(','))
+    assert 'header_keys' in caplog.text
+
+
+def test_font_sizes_can_be_set(config_path):
+    _write_config(config_path, 'custom.json', {'font_sizes': {'graph_title': 30}})
+    config = rc.ReportConfig('custom.json', config_path=str(config_path))
+    assert config.font_sizes['graph_title'] == 30
+    # The sizes that weren't set still follow annotation_font
+    config.annotation_font = 20
+    assert config.font_sizes['legend_text'] == 20
+    assert config.font_px('graph_title') == int(30/100*config.dpi)
+
+    config.font_sizes = dict(config.font_sizes, legend_text=10)
+    assert config.font_sizes['legend_text'] == 10
+    assert config.font_px('legend_text') == int(10/100*config.dpi)
+
+
+def test_paper_dimensions_per_config(config_path):
+    config = rc.ReportConfig(config_path=str(config_path))
+    config.paper_dimensions['landscape'] = (14, 8.5)
+    assert rc.ReportConfig(config_path=str(config_path)).paper_dimensions['landscape'] == (
+        11.69, 8.27)
+
+
+def test_json_reparsed_after_change(config_path):
+    _write_config(config_path, 'custom.json', {'dpi': 300})
+    assert rc.ReportConfig('custom.json', config_path=str(config_path)).dpi == 300
+    _write_config(config_path, 'custom.json', {'dpi': 72})
+    stat = os.stat(str(config_path / 'custom.json'))
+    os.utime(str(config_path / 'custom.json'), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert rc.ReportConfig('custom.json', config_path=str(config_path)).dpi == 72
+
+
+def test_font_px_follows_dpi_and_font(config_path):
+    config = rc.ReportConfig(config_path=str(config_path))
+    config.annotation_font = 16
+    config.dpi = 150
+    assert config.font_px('GA_text') == int(16*1.5/100*150)
+    config.dpi = 300
+    assert config.font_px('GA_text') == int(16*1.5/100*300)
+    config.annotation_font = 20
+    assert config.font_px('axis_labels') == int(int(20/1.2)/100*300)
+    assert config.font_sizes['graph_title'] == 20*1.2
+
+
+def test_header_keys_follow_header_attribs(config_path):
+    config = rc.ReportConfig(config_path=str(config_path))
+    config.header_attribs = 'Graduate Attribute, Indicator ,Level'
+    assert config.header_keys == ('Graduate Attribute', 'Indicator', 'Level')
+    config.header_attribs = 'Course'
+    assert config.header_keys == ('Course',)
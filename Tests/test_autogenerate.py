@@ -0,0 +1,154 @@
+"""Tests for ReportGenerator.start_autogenerate with and without a worker pool
+
+The indicators come from a small stand-in for DataStore, the grades from a temporary
+Grades folder, and the histograms get "rendered" by the fake_kaleido fixture in
+conftest.py, so nothing needs the real data folders or an image export engine. Worker
+processes get forked, so they see the stand-in kaleido as well
+"""
+
+# Temp import for testing
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import Report as report_module
+import ReportGenerator
+from ReportConfig import ReportConfig
+
+
+INDICATORS = pd.DataFrame({
+    'Graduate Attribute': ['KB', 'KB', 'PA', 'PA', 'DE', 'KB'],
+    'Indicator #': ['KB.1', 'KB.2', 'PA.1', 'PA.2', 'DE.1', 'KB.3'],
+    'Indicator Description': ['d1', 'd2', 'd3', 'd4', 'd5', 'd6'],
+    'Level': ['I', 'D', 'A', 'I', 'D', 'A'],
+    'Course #': ['ENGI 3821', 'ENGI 1040', 'ENGI 9999', 'ENGI 3821', 'ENGI 3821', 'ENGI 9999'],
+    'Course Description': ['c1', 'c2', 'c3', 'c1', 'c1', 'c3'],
+    'Method of Assessment': ['Final Exam', 'Midterm', 'Lab', 'Final Exam', 'Final Exam', 'Lab'],
+    'Bins': ['55, 65, 80, 100', '50,60,70,80,100', '55, 65, 80, 100', None, 'a,b',
+        '55, 65, 80, 100'],
+    'Assessed': ['Yes', 'yes', 'YES', 'yes', 'Yes', 'yes'],
+})
+
+# The missing data file that start_autogenerate wrote for INDICATORS before rows were
+# rendered separately from being queued up. The entries are in row order
+MISSING_DATA = (
+    "Missing data for ENGI 9999 Lab (PA.1-A)\n"
+    "Missing bin ranges for ENGI 3821 Final Exam (PA.2-I)\n"
+    "No useable bins for ENGI 3821 Final Exam (DE.1-D)\n"
+    "Missing data for ENGI 9999 Lab (KB.3-A)\n"
+)
+
+
+class FakeDataStore(object):
+    """Hands out the same indicator table for every program"""
+    unique_courses = pd.DataFrame({'Course #': ['ENGI 1040'], 'Term Offered': [1]})
+
+    def load_indicators(self, programs):
+        pass
+
+    def query_indicators(self, program, dict_of_queries=None):
+        return INDICATORS.copy()
+
+
+def _exit_worker(generator):
+    """Stands in for _init_worker to make every worker process die on start up"""
+    os._exit(1)
+
+
+@pytest.fixture
+def generator(tmp_path, monkeypatch, fake_kaleido):
+    """A ReportGenerator for ENEL working in a temporary folder"""
+    for folder in ['Grades/ENEL', 'Grades/ECE', 'Grades/Core', 'Grades/Co-op',
+            'Missing Data', 'run']:
+        os.makedirs(str(tmp_path / folder))
+    pd.DataFrame({201603: [50, 60, 70, np.nan], 201703: [80, 90, 55, 45]}).to_excel(
+        str(tmp_path / 'Grades/ENEL/ENGI 3821 Final Exam.xlsx'), index=False)
+    pd.DataFrame({201603: [50, 60, 70, 99]}).to_excel(
+        str(tmp_path / 'Grades/Core/ENGI 1040 Midterm.xlsx'), index=False)
+    # Missing data files get written to ../Missing Data
+    monkeypatch.chdir(str(tmp_path / 'run'))
+
+    # Keep the stand-in kaleido's server out of the other tests
+    monkeypatch.setattr(report_module, '_export_server_pid', None)
+    monkeypatch.setattr(report_module.atexit, 'register', lambda func, **kwargs: None)
+
+    gen = ReportGenerator.ReportGenerator(ReportConfig(), programs=['ENEL'],
+        ds=FakeDataStore(), grades_loc=str(tmp_path / 'Grades'),
+        histograms_loc=str(tmp_path / 'Histograms'))
+    # __init__ only keeps a DataStore that it makes itself
+    gen.ds = FakeDataStore()
+    return gen
+
+
+def _results(tmp_path, histograms='Histograms'):
+    """Get the contents of every saved histogram, keyed by file name, and the missing data"""
+    histograms = str(tmp_path / histograms)
+    saved = dict()
+    for folder, _, files in os.walk(histograms):
+        for name in files:
+            path = os.path.join(folder, name)
+            with open(path, 'rb') as image_file:
+                saved[os.path.relpath(path, histograms)] = image_file.read()
+    with open(str(tmp_path / 'Missing Data/ENEL missing data.txt')) as missing_file:
+        missing = missing_file.read()
+    return saved, missing
+
+
+def test_autogenerate_in_process(generator, tmp_path):
+    generator.start_autogenerate()
+    saved, missing = _results(tmp_path)
+    assert len(saved) > 0
+    assert 'ENGI 9999' in missing
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_missing_data_in_row_order(generator, tmp_path, max_workers):
+    generator.start_autogenerate(max_workers=max_workers)
+    assert _results(tmp_path)[1] == MISSING_DATA
+
+
+def test_autogenerate_pool_matches_in_process(generator, tmp_path):
+    generator.start_autogenerate()
+    in_process = _results(tmp_path)
+    generator.config.histograms_loc = str(tmp_path / 'Pool Histograms')
+    generator.start_autogenerate(max_workers=2)
+    assert _results(tmp_path, 'Pool Histograms') == in_process
+
+
+def test_autogenerate_broken_pool(generator, monkeypatch):
+    monkeypatch.setattr(ReportGenerator, '_init_worker', _exit_worker)
+    with pytest.raises(RuntimeError, match='max_workers=1'):
+        generator.start_autogenerate(max_workers=2)
+
+
+def test_autogenerate_pool_breaks_while_queueing(generator, monkeypatch):
+    # Workers that die on start up can break the pool before every row is submitted
+    def broken(*args, **kwargs):
+        raise ReportGenerator.BrokenProcessPool("A child process terminated abruptly")
+    monkeypatch.setattr(ReportGenerator.ReportGenerator, '_render_rows', broken)
+    with pytest.raises(RuntimeError, match='max_workers=1'):
+        generator.start_autogenerate(max_workers=2)
+
+
+def test_autogenerate_pool_saves_in_batches(generator, tmp_path, fake_kaleido):
+    calls = str(tmp_path / 'calls.txt')
+    def record(kind, func):
+        # Workers are separate processes, so the calls get recorded in a file
+        def recorded(*args, **kwargs):
+            with open(calls, 'a') as calls_file:
+                calls_file.write(kind + '\n')
+            return func(*args, **kwargs)
+        return recorded
+    fake_kaleido.calc_fig_sync = record('single', fake_kaleido.calc_fig_sync)
+    fake_kaleido.write_fig_from_object_sync = record('batch',
+        fake_kaleido.write_fig_from_object_sync)
+
+    generator.start_autogenerate(max_workers=2)
+    with open(calls) as calls_file:
+        kinds = calls_file.read().split()
+    # One batch for each of the two groups of rows, and no single saves
+    assert kinds == ['batch', 'batch']
@@ -0,0 +1,104 @@
+"""Checks that every histogram kernel in fast_hist counts like np.histogram
+
+The values sit on, and one ulp either side of, every bin edge, which is where rounding
+in the equal width kernels can put a value in the wrong bin
+"""
+
+# Temp import for testing
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+
+import subprocess
+
+import numpy as np
+import pytest
+
+import fast_hist
+
+
+def _numba_uniform(values, edges):
+    return fast_hist._hist_cols_numba(values, edges, True)
+
+
+def _numba_search(values, edges):
+    return fast_hist._hist_cols_numba(values, edges, False)
+
+
+KERNELS = [
+    pytest.param(fast_hist._hist_cols_numpy, id='numpy'),
+    pytest.param(fast_hist._hist_cols_numpy_uniform, id='numpy_uniform'),
+    pytest.param(_numba_uniform, id='numba_uniform', marks=pytest.mark.skipif(
+        fast_hist.njit is None, reason="numba is not installed")),
+    pytest.param(_numba_search, id='numba_search', marks=pytest.mark.skipif(
+        fast_hist.njit is None, reason="numba is not installed")),
+    pytest.param(fast_hist._hist_cols_uniform, id='fast_histogram', marks=pytest.mark.skipif(
+        fast_hist.histogram1d is None, reason="fast_histogram is not installed")),
+    pytest.param(fast_hist.hist_cols, id='hist_cols'),
+]
+
+EDGES = [
+    pytest.param(np.array([-1., 0., 1., 2., 3., 4.]), id='unit'),
+    pytest.param(np.linspace(0., 100., 11), id='tens'),
+    pytest.param(np.array([55., 65., 75., 85., 95.]), id='offset'),
+]
+
+
+def _edge_values(edges):
+    """Build a column-major array of values on and right next to every edge"""
+    base = np.concatenate([
+        edges,
+        np.nextafter(edges, -np.inf),
+        np.nextafter(edges, np.inf),
+        [np.nan, np.inf, -np.inf],
+    ])
+    shuffled = np.random.default_rng(0).permutation(base)
+    return np.asfortranarray(np.column_stack([base, shuffled, np.full(len(base), np.nan)]))
+
+
+@pytest.mark.parametrize('edges', EDGES)
+@pytest.mark.parametrize('kernel', KERNELS)
+def test_matches_np_histogram(kernel, edges):
+    values = _edge_values(edges)
+    expected = np.array([np.histogram(col[~np.isnan(col)], bins=edges)[0]
+        for col in values.T])
+    np.testing.assert_array_equal(kernel(values, edges), expected)
+
+
+@pytest.mark.parametrize('kernel', KERNELS)
+def test_random_grades(kernel):
+    edges = np.array([0., 50., 55., 60., 65., 70., 75., 80., 100.])
+    if kernel in (fast_hist._hist_cols_numpy_uniform, fast_hist._hist_cols_uniform,
+            _numba_uniform):
+        edges = np.linspace(0., 100., 21)
+    values = np.round(np.random.default_rng(1).uniform(-5, 105, (200, 4)), 1)
+    values[::7, 1] = np.nan
+    expected = np.array([np.histogram(col[~np.isnan(col)], bins=edges)[0]
+        for col in values.T])
+    np.testing.assert_array_equal(kernel(values, edges), expected)
+
+
+def _threading_layer(code, **env):
+    """Run code in a fresh interpreter and get the numba threading layer it left set"""
+    script = ("import sys; sys.path.insert(0, {!r}); import numba, numpy as np, fast_hist; "
+        "{}; print(numba.config.THREADING_LAYER)").format(
+        os.path.dirname(os.path.abspath(fast_hist.__file__)), code)
+    # Only the layer passed in gets picked with the environment variable
+    environ = {key: value for key, value in os.environ.items()
+        if key != 'NUMBA_THREADING_LAYER'}
+    environ.update(env)
+    return subprocess.run([sys.executable, '-c', script], env=environ, check=True,
+        capture_output=True, text=True).stdout.split()[-1]
+
+
+@pytest.mark.skipif(fast_hist.njit is None, reason="numba is not installed")
+def test_threading_layer_picked_on_first_use():
+    # Importing fast_hist leaves numba's settings alone
+    assert _threading_layer('pass') == 'default'
+    assert _threading_layer('fast_hist.use_fork_safe_threading()') == 'workqueue'
+    # The first histogram made with the kernel picks it too
+    assert _threading_layer(
+        'fast_hist.hist_cols(np.zeros((3, 2)), np.array([0.0, 1.0, 3.0]))') == 'workqueue'
+    # A layer picked with the environment variable wins
+    assert _threading_layer('fast_hist.use_fork_safe_threading()',
+        NUMBA_THREADING_LAYER='omp') == 'omp'
@@ -0,0 +1,101 @@
+"""Tests for the directory listing and grades file caches in grades_org"""
+
+# Temp import for testing
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import grades_org
+
+
+# A modified time far enough in the past for the caches to trust it
+OLD = 10**18
+
+
+def _set_mtime(path, mtime_ns):
+    os.utime(str(path), ns=(mtime_ns, mtime_ns))
+
+
+def test_list_dir_reuses_listing(tmp_path, monkeypatch):
+    (tmp_path / 'ENGI 1040 Midterm.xlsx').touch()
+    _set_mtime(tmp_path, OLD)
+    assert grades_org.list_dir(str(tmp_path)) == ['ENGI 1040 Midterm.xlsx']
+
+    # An unchanged directory doesn't get listed again
+    def fail(path):
+        raise AssertionError("The directory got listed again")
+    monkeypatch.setattr(grades_org.os, 'scandir', fail)
+    assert grades_org.list_dir(str(tmp_path)) == ['ENGI 1040 Midterm.xlsx']
+
+
+def test_list_dir_sees_new_files(tmp_path):
+    (tmp_path / 'ENGI 1040 Midterm.xlsx').touch()
+    _set_mtime(tmp_path, OLD)
+    grades_org.list_dir(str(tmp_path))
+    (tmp_path / 'ENGI 3821 Final Exam.xlsx').touch()
+    assert sorted(grades_org.list_dir(str(tmp_path))) == [
+        'ENGI 1040 Midterm.xlsx', 'ENGI 3821 Final Exam.xlsx']
+
+
+def test_list_dir_sees_changes_in_the_same_tick(tmp_path):
+    # On a file system with coarse modified times, a file added right after the
+    # directory was listed can leave its modified time the same
+    (tmp_path / 'ENGI 1040 Midterm.xlsx').touch()
+    mtime = os.stat(str(tmp_path)).st_mtime_ns
+    grades_org.list_dir(str(tmp_path))
+    (tmp_path / 'ENGI 3821 Final Exam.xlsx').touch()
+    _set_mtime(tmp_path, mtime)
+    assert sorted(grades_org.list_dir(str(tmp_path))) == [
+        'ENGI 1040 Midterm.xlsx', 'ENGI 3821 Final Exam.xlsx']
+
+
+def test_list_dir_missing(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        grades_org.list_dir(str(tmp_path / 'Nope'))
+
+
+def test_read_grades_returns_copies(tmp_path):
+    path = str(tmp_path / 'ENGI 1040 Midterm.xlsx')
+    pd.DataFrame({201603: [50, 60, np.nan]}).to_excel(path, index=False)
+    _set_mtime(path, OLD)
+    first = grades_org.read_grades(path)
+    first[201603] = 0
+    second = grades_org.read_grades(path)
+    assert list(second[201603].dropna()) == [50, 60]
+
+
+def test_read_grades_rereads_changed_file(tmp_path):
+    path = str(tmp_path / 'ENGI 1040 Midterm.xlsx')
+    pd.DataFrame({201603: [50, 60]}).to_excel(path, index=False)
+    _set_mtime(path, OLD)
+    grades_org.read_grades(path)
+    pd.DataFrame({201703: [70]}).to_excel(path, index=False)
+    assert list(grades_org.read_grades(path).columns) == [201703]
+
+
+def test_read_grades_sees_changes_with_the_same_mtime(tmp_path):
+    path = str(tmp_path / 'ENGI 1040 Midterm.xlsx')
+    pd.DataFrame({201603: [50, 60]}).to_excel(path, index=False)
+    _set_mtime(path, OLD)
+    grades_org.read_grades(path)
+    # A file with a different size gets read again
+    pd.DataFrame({201703: [70, 80, 90, 100]}).to_excel(path, index=False)
+    _set_mtime(path, OLD)
+    assert list(grades_org.read_grades(path).columns) == [201703]
+
+    # A recently changed file doesn't get cached, so a change in the same tick with
+    # the same size still gets read
+    pd.DataFrame({201603: [50, 60]}).to_excel(path, index=False)
+    mtime = os.stat(path).st_mtime_ns
+    grades_org.read_grades(path)
+    pd.DataFrame({201604: [50, 61]}).to_excel(path, index=False)
+    _set_mtime(path, mtime)
+    assert list(grades_org.read_grades(path).columns) == [201604]
+
+
+def test_true_size():
+    assert grades_org.true_size(pd.Series([1, np.nan, 3])) == 2
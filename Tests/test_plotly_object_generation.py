@@ -0,0 +1,53 @@
+"""Tests for sharing generated layouts between Reports"""
+
+# Temp import for testing
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+
+from collections import OrderedDict
+
+import pytest
+
+import plotly_object_generation as pog
+from ReportConfig import ReportConfig
+
+
+@pytest.fixture(autouse=True)
+def layouts(monkeypatch):
+    """An empty layout cache for each test"""
+    monkeypatch.setattr(pog, '_layouts', OrderedDict())
+    return pog._layouts
+
+
+def test_layout_json_matches_generate_layout():
+    config = ReportConfig()
+    assert pog.layout_json(config) == pog.generate_layout(config).to_plotly_json()
+    assert pog.layout_json(ReportConfig()) is pog.layout_json(config)
+
+
+def test_layout_json_follows_paper_dimensions(monkeypatch):
+    config = ReportConfig()
+    pog.layout_json(config)
+    monkeypatch.setitem(config.paper_dimensions, config.orientation, (8.5, 11))
+    layout = pog.layout_json(config)
+    assert (layout['width'], layout['height']) == (int(8.5*config.dpi), int(11*config.dpi))
+
+
+def test_layout_json_follows_font_sizes():
+    config = ReportConfig()
+    before = pog.layout_json(config)
+    config.font_sizes['legend_text'] = 30
+    layout = pog.layout_json(config)
+    assert layout is not before
+    assert layout == pog.generate_layout(config).to_plotly_json()
+
+
+def test_layout_cache_is_bounded(layouts, monkeypatch):
+    monkeypatch.setattr(pog, '_LAYOUT_CACHE_SIZE', 2)
+    config = ReportConfig()
+    for dpi in [100, 150, 100, 200]:
+        config.dpi = dpi
+        pog.layout_json(config)
+    # 150 was the least recently used layout when 200 was added
+    assert [key[2] for key in layouts] == [100, 200]
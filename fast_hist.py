@@ -0,0 +1,244 @@
+"""Histogram kernels used by Report.plot
+
+If fast_histogram is installed and the bins are all the same width, the grades get
+histogrammed with it. Otherwise, if numba is installed, a compiled kernel that works
+through the columns in parallel gets used. If neither is installed, a NumPy version that
+does the same thing with np.bincount gets used instead, which only needs np.searchsorted
+when the bins are not all the same width
+"""
+import numpy as np
+import logging
+import os
+
+try:
+    import numba
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+try:
+    from fast_histogram import histogram1d
+except ImportError:
+    histogram1d = None
+
+# Whether use_fork_safe_threading has run yet
+_threading_set_up = False
+
+
+def _hist_cols_numpy(values, edges):
+    """Count how many values of each column fall into each bin
+
+    Gives the same counts as running np.histogram(column, bins=edges)[0] on every
+    column, but finds the bin of every value with a single np.searchsorted call and
+    counts all of the columns at once with one np.bincount, by offsetting each
+    column's bin numbers by column*nbins. Like np.histogram, the last bin includes its
+    right edge, and values outside of the edges (including NaN) do not get counted.
+
+    Args:
+        values(np.ndarray): A 2D array with one data set per column. Column-major
+            arrays are the fastest to flatten
+        edges(np.ndarray): The bin edges in increasing order
+
+    Returns:
+        np.ndarray(int): An array of shape (columns, bins) with the number of values
+            in each bin for every column
+    """
+    nbins = len(edges) - 1
+    ncols = values.shape[1]
+    flat = values.ravel(order='F')
+    idx = np.searchsorted(edges, flat, side='right') - 1
+    # Values sitting on the last edge belong to the last bin
+    idx[flat == edges[-1]] = nbins - 1
+    # Offset every column's bins so that they don't overlap, then drop the values that
+    # are outside of the edges
+    keys = idx + np.repeat(np.arange(ncols) * nbins, values.shape[0])
+    keys = keys[(idx >= 0) & (idx < nbins)]
+    return np.bincount(keys, minlength=ncols*nbins).reshape(ncols, nbins)
+
+
+def _hist_cols_numpy_uniform(values, edges):
+    """Count how many values of each column fall into each bin of equal width
+
+    Same as _hist_cols_numpy, but skips np.searchsorted: the bin of every value is
+    worked out by dividing by the bin width, then nudged by one bin wherever rounding
+    put it on the wrong side of an edge, the same way np.histogram does
+
+    Args:
+        values(np.ndarray): A 2D array with one data set per column. Column-major
+            arrays are the fastest to flatten
+        edges(np.ndarray): The bin edges in increasing order, all the same distance
+            apart
+
+    Returns:
+        np.ndarray(int): An array of shape (columns, bins) with the number of values
+            in each bin for every column
+    """
+    nbins = len(edges) - 1
+    ncols = values.shape[1]
+    lo = edges[0]
+    hi = edges[-1]
+    flat = values.ravel(order='F')
+    # Only keep values inside of the edges, which also drops NaN. Keep track of which
+    # column each value came from
+    inside = (flat >= lo) & (flat <= hi)
+    cols = np.repeat(np.arange(ncols), values.shape[0])[inside]
+    flat = flat[inside]
+    idx = ((flat - lo) / ((hi - lo) / nbins)).astype(np.intp)
+    # Values sitting on the last edge belong to the last bin
+    np.minimum(idx, nbins - 1, out=idx)
+    idx[flat < edges[idx]] -= 1
+    idx[(flat >= edges[idx + 1]) & (idx != nbins - 1)] += 1
+    return np.bincount(cols*nbins + idx, minlength=ncols*nbins).reshape(ncols, nbins)
+
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _hist_cols_numba(values, edges, uniform):
+        """Compiled, column-parallel version of _hist_cols_numpy
+
+        When uniform is True, the bin of a value is worked out by dividing by the bin
+        width instead of with a binary search. The guess gets nudged by one bin if
+        rounding put it on the wrong side of an edge, the same way np.histogram does
+        """
+        nbins = len(edges) - 1
+        ncols = values.shape[1]
+        lo = edges[0]
+        hi = edges[nbins]
+        width = (hi - lo) / nbins
+        counts = np.zeros((ncols, nbins), dtype=np.int64)
+        for j in prange(ncols):
+            # Each column gets counted into its own local array
+            col_counts = np.zeros(nbins, dtype=np.int64)
+            for i in range(values.shape[0]):
+                v = values[i, j]
+                # NaN fails both comparisons, so it gets skipped here too
+                if not (v >= lo and v <= hi):
+                    continue
+                if v == hi:
+                    k = nbins - 1
+                elif uniform:
+                    k = min(int((v - lo) / width), nbins - 1)
+                    if v < edges[k]:
+                        k -= 1
+                    elif v >= edges[k + 1]:
+                        k += 1
+                else:
+                    k = np.searchsorted(edges, v, side='right') - 1
+                col_counts[k] += 1
+            counts[j, :] = col_counts
+        return counts
+
+
+def _is_uniform(edges):
+    """Check if every bin is exactly the same width
+
+    Args:
+        edges(np.ndarray): The bin edges in increasing order
+
+    Returns:
+        bool: True if all of the bins have the same width
+    """
+    widths = np.diff(edges)
+    return bool(np.all(widths == widths[0]))
+
+
+def _hist_cols_uniform(values, edges):
+    """Count how many values of each column fall into each bin with fast_histogram
+
+    Only works for bins that are all the same width. fast_histogram skips NaN values
+    and values outside of the range like np.histogram does, but it also skips values
+    sitting on the last edge, so those get added to the last bin afterwards. It also
+    doesn't correct for rounding, so a value within a few ulps of an edge can end up
+    one bin over. Those values get counted again with np.histogram and the difference
+    is fixed up, which leaves the same counts as np.histogram on every column
+
+    Args:
+        values(np.ndarray): A 2D float64 array with one data set per column
+        edges(np.ndarray): The float64 bin edges in increasing order
+
+    Returns:
+        np.ndarray(int): An array of shape (columns, bins) with the number of values
+            in each bin for every column
+    """
+    nbins = len(edges) - 1
+    bin_range = (edges[0], edges[-1])
+    counts = np.empty((values.shape[1], nbins), dtype=np.int64)
+    for j in range(values.shape[1]):
+        counts[j] = histogram1d(values[:, j], bins=nbins, range=bin_range)
+    counts[:, -1] += np.count_nonzero(values == edges[-1], axis=0)
+    # Find the values close enough to their nearest edge that rounding could have put
+    # them in the wrong bin. NaN is never close to anything, so it drops out here
+    lo, hi = bin_range
+    tol = 64 * np.finfo(np.float64).eps * (abs(lo) + abs(hi) + (hi - lo))
+    with np.errstate(invalid='ignore'):
+        nearest = np.clip(np.rint(np.nan_to_num((values - lo) / ((hi - lo) / nbins))),
+            0, nbins).astype(np.intp)
+        near = np.abs(values - edges[nearest]) <= tol
+    for j in np.flatnonzero(near.any(axis=0)):
+        close = values[near[:, j], j]
+        # Take back what fast_histogram (plus the last edge fix) counted for these
+        # values, and count them again the way np.histogram does
+        counted = histogram1d(close, bins=nbins, range=bin_range).astype(np.int64)
+        counted[-1] += np.count_nonzero(close == hi)
+        counts[j] += np.histogram(close, bins=edges)[0] - counted
+    return counts
+
+
+def hist_cols(values, edges):
+    """Count how many values of each column fall into each bin
+
+    Uses fast_histogram for bins of equal width when it is available, then the
+    compiled kernel when numba is available, and the NumPy version otherwise. All of
+    them give the same counts as np.histogram on every column, with NaN values left
+    uncounted
+
+    Args:
+        values(np.ndarray): A 2D float64 array with one data set per column
+        edges(np.ndarray): The float64 bin edges in increasing order
+
+    Returns:
+        np.ndarray(int): An array of shape (columns, bins) with the number of values
+            in each bin for every column
+    """
+    if histogram1d is not None and _is_uniform(edges):
+        logging.debug("Bins are uniform, histogramming with fast_histogram")
+        return _hist_cols_uniform(values, edges)
+    if njit is not None:
+        logging.debug("Histogramming with the numba kernel")
+        if not _threading_set_up:
+            use_fork_safe_threading()
+        return _hist_cols_numba(values, edges, _is_uniform(edges))
+    if _is_uniform(edges):
+        logging.debug("Bins are uniform, histogramming with NumPy without a search")
+        return _hist_cols_numpy_uniform(values, edges)
+    logging.debug("Histogramming with NumPy")
+    return _hist_cols_numpy(values, edges)
+
+
+def use_fork_safe_threading():
+    """Have the numba kernel use a threading layer that worker processes can be forked from
+
+    ReportGenerator forks worker processes to render histograms. Once a parallel kernel
+    has run with the TBB threading layer, a fork leaves it hanging when the process
+    exits, so this picks numba's own workqueue layer instead, unless one was picked with
+    NUMBA_THREADING_LAYER. The kernel never gets run from more than one thread at a
+    time, which is all that workqueue needs.
+
+    numba picks its layer the first time a parallel kernel runs and keeps it after that,
+    so hist_cols calls this before it first runs the kernel. Importing this module
+    leaves numba alone
+    """
+    global _threading_set_up
+    _threading_set_up = True
+    if njit is None or 'NUMBA_THREADING_LAYER' in os.environ:
+        return
+    try:
+        layer = numba.threading_layer()
+    except ValueError:
+        # No parallel kernel has run yet
+        numba.config.THREADING_LAYER = 'workqueue'
+        return
+    if layer == 'tbb':
+        logging.warning("numba is already using the TBB threading layer, so worker "
+            "processes may hang when they exit. Set NUMBA_THREADING_LAYER=workqueue to "
+            "avoid it")
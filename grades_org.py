@@ -7,10 +7,40 @@ proper database interface. Some of the functions may be able to carry over.
 import pandas as pd
 import numpy as np
 import os
+import time
 from collections import defaultdict
 import logging
 import textformatting as tf
 
+# Directory listings from list_dir, keyed by path. Stored as ((modified time, size),
+# file names)
+_dir_listings = dict()
+
+# Grades files from read_grades, keyed by path. Stored as ((modified time, size),
+# DataFrame)
+_grades_files = dict()
+
+# Some file systems only keep modified times to the nearest 2 seconds (e.g. FAT), so a
+# change made that soon after the last one can leave the modified time the same
+_MTIME_RESOLUTION_NS = 2*10**9
+
+
+def _cacheable(stat):
+    """Check whether a file or directory was last changed long enough ago to cache it
+
+    If it was changed within _MTIME_RESOLUTION_NS of now, another change could still
+    happen without changing its modified time, so whatever was read from it can't be
+    trusted the next time
+
+    Args:
+        stat(os.stat_result): The result of os.stat taken before reading it
+
+    Returns:
+        bool: True if its modified time will show any later change
+    """
+    return time.time_ns() - stat.st_mtime_ns > _MTIME_RESOLUTION_NS
+
+
 def open_grades(row, program, course_col_name = None, assessment_col_name = None, grades_top_folder = None, file=None):
     """Return a Pandas DataFrame containing grades associated to Indicator sheet row
 
@@ -66,15 +96,15 @@ def cols_to_cohorts(grades, course_name, course_term_offered=None):
         list(str): A list of strings, all as cohort messages
     """
     logging.info("Changing DataFrame columns to cohort messages")
-    renamed_columns = list()
-    for col in grades.columns:
-        # Get the real size of the grade column (size without Null values)
-        cohort_size = true_size(grades[col])
-        renamed_columns.append("CO{}: {} STUDENTS".format(
-            tf.get_cohort(col, course=course_name, term_taken = course_term_offered),
-            cohort_size
-        ))
-    return renamed_columns
+    get_cohort = tf.get_cohort
+    # The real size of each grade column is its size without Null values (see
+    # true_size). DataFrame.count gets those for every column at once
+    sizes = grades.count().tolist()
+    return ["CO{}: {} STUDENTS".format(
+        get_cohort(col, course=course_name, term_taken = course_term_offered),
+        size
+        ) for col, size in zip(grades.columns, sizes)
+    ]
 
 
 def true_size(ser):
@@ -94,14 +124,8 @@ def true_size(ser):
     Returns:
         int: The size of the Pandas Series without null values
     """
-    figure_out_size = list()
-    # Iterate through the values of the Series
-    for x in ser:
-        # Append to figure_out_size as long as the value isn't Null according to Pandas
-        if not pd.isnull(x):
-            figure_out_size.append(x)
-    
-    return len(figure_out_size)
+    # Series.count leaves out the same values that pd.isnull finds, but counts them in C
+    return int(ser.count())
 
 
 def find_grades_files(course, assessment, file_list):
@@ -144,6 +168,75 @@ def find_grades_files(course, assessment, file_list):
     return matches
 
 
+def list_dir(path):
+    """List the file names in a directory, reusing the last listing if nothing changed
+
+    directory_search gets called for every indicator during autogeneration, and usually
+    on the same handful of grades folders. The listing of each folder gets saved along
+    with the folder's modified time and size, so the folder only gets listed again
+    (using os.scandir) after a file is added, removed or renamed in it. Folders that
+    changed in the last couple of seconds don't get saved, since they could change
+    again without their modified time changing. Changes to the files themselves
+    don't matter here, read_grades checks for those.
+
+    Args:
+        path(string): The directory to list
+
+    Returns:
+        list(string): The names of the entries in the directory
+
+    Exceptions:
+        FileNotFoundError: Raised when the directory does not exist
+    """
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _dir_listings.get(path)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    logging.debug("Listing directory %s", path)
+    with os.scandir(path) as entries:
+        names = [entry.name for entry in entries]
+    if _cacheable(stat):
+        _dir_listings[path] = (version, names)
+    else:
+        _dir_listings.pop(path, None)
+    return names
+
+
+def read_grades(path):
+    """Read a grades file, reusing the last read if the file hasn't changed
+
+    Several indicators are often measured with the same assessment, so the same
+    grades file can get opened for many rows of an indicator sheet. Each file only
+    gets parsed by Pandas the first time, and again after its modified time or size
+    changes. Like list_dir, files that changed in the last couple of seconds get
+    parsed every time.
+
+    Args:
+        path(string): The path to the grades Excel file
+
+    Returns:
+        pd.DataFrame: The grades. It is a copy, so it can be changed freely
+
+    Exceptions:
+        FileNotFoundError: Raised when the file does not exist
+    """
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _grades_files.get(path)
+    if cached and cached[0] == version:
+        logging.debug("Reusing grades already read from %s", path)
+        return cached[1].copy()
+
+    grades = pd.read_excel(path)
+    if _cacheable(stat):
+        _grades_files[path] = (version, grades)
+        return grades.copy()
+    _grades_files.pop(path, None)
+    return grades
+
+
 def directory_search(course, assessment, main_dir, subdirs):
     """Search a list of directories for a course file
 
@@ -176,7 +269,7 @@ def directory_search(course, assessment, main_dir, subdirs):
     for folder in subdirs:
         logging.debug("Searching folder %s", folder)
         # Run the find_grades_files function on the folder in the subdirectory
-        ls = find_grades_files(course, assessment, os.listdir(main_dir + '/' + folder))
+        ls = find_grades_files(course, assessment, list_dir(main_dir + '/' + folder))
         results[folder] = []
         if ls:
             results[folder] += ls
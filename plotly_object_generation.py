@@ -1,6 +1,13 @@
 """Functions to generate certain plotly objects for the Report"""
+from collections import OrderedDict
+
 import plotly.graph_objs as go
 
+# Layouts made by layout_json, keyed by the config options that they depend on. Only
+# the most recently used ones are kept
+_layouts = OrderedDict()
+_LAYOUT_CACHE_SIZE = 16
+
 def generate_layout(config):
     """Generate Layout object
 
@@ -42,12 +49,11 @@ def generate_layout(config):
         barmode = 'group',
         # Set axes fonts to be relatively small and set y axis range to 0-100
         xaxis = dict(
-            tickfont=dict(size=int(config.font_sizes['axis_labels']/100*config.dpi))
+            tickfont=dict(size=config.font_px('axis_labels'))
         ),
         yaxis = dict(
-            title="% OF CLASS",
-            titlefont=dict(size=int(config.font_sizes['yaxis_title']/100*config.dpi)),
-            tickfont=dict(size=int(config.font_sizes['axis_labels']/100*config.dpi)),
+            title=dict(text="% OF CLASS", font=dict(size=config.font_px('yaxis_title'))),
+            tickfont=dict(size=config.font_px('axis_labels')),
             range=(0,100),
             nticks=10
         ),
@@ -58,7 +64,38 @@ def generate_layout(config):
             orientation = 'h',
             xanchor = 'center', yanchor = 'bottom',
             x= 0.5, y = -config.font_sizes['legend_text']/100,
-            font = dict(size=int(config.font_sizes['legend_text']/100*config.dpi))
+            font = dict(size=config.font_px('legend_text'))
         )
     )
     return layout
+
+
+def layout_json(config):
+    """Get the layout for a config as a plain dict, generating it only once
+
+    Every Report made with the same options gets the same layout, and validating
+    it (MUN logo included) is the slowest part of setting one up. The layout gets
+    generated the first time it's needed and reused after that, for as long as it is
+    one of the _LAYOUT_CACHE_SIZE most recently used layouts
+
+    Args:
+        config: A ReportConfig object
+
+    Returns:
+        dict: The layout from generate_layout as plotly JSON. It is shared, so copy
+            it before making any changes
+    """
+    # Everything generate_layout reads from the config. font_px is worked out from
+    # font_sizes and dpi
+    key = (config.orientation, tuple(config.paper_dimensions[config.orientation]),
+        config.dpi, config.annotation_font, tuple(sorted(config.font_sizes.items())),
+        config.add_legend, config.MUN_logo)
+    layout = _layouts.get(key)
+    if layout is None:
+        layout = generate_layout(config).to_plotly_json()
+        _layouts[key] = layout
+        if len(_layouts) > _LAYOUT_CACHE_SIZE:
+            _layouts.popitem(last=False)
+    else:
+        _layouts.move_to_end(key)
+    return layout
@@ -2,6 +2,8 @@
 import textwrap
 import re
 import logging
+import functools
+import numpy as np
 
 def format_annotation_text(header_info, textwrap_lim=60, sep='<br>'):
     """Create a table-like format for the header text on a Report
@@ -65,6 +67,21 @@ def format_percents(values):
     return formatted_percents
 
 
+def format_percents_2d(values):
+    """Turn every row of a 2D NumPy array into a list of percentage strings
+
+    Formats the whole array with a single np.char.mod call instead of calling
+    format_percents once per row
+
+    Args:
+        values: a 2D NumPy array (or nested list) containing numbers
+
+    Returns:
+        list(list(str)): One list of percent strings with no decimal places per row
+    """
+    return np.char.mod('%.0f%%', np.asarray(values, dtype=np.float64)).tolist()
+
+
 def format_bin_ranges(bins, bin_labels):
     """Format bins into a text description
 
@@ -92,7 +109,7 @@ def format_bin_ranges(bins, bin_labels):
     bin_description = "Bin ranges: marks out of {:.0f}<br>".format(bins[size])
     # If the first bin is <=0, use a '<' sign to indicate the first bin
     if bins[0] <= 0:
-        logging.debug("First bin was %s, adding a < sign", str(bins[0]))
+        logging.debug("First bin was %s, adding a < sign", bins[0])
         bin_description += "<{:.0f}: {}   ".format(bins[1],bin_labels[0])
     else:
         bin_description += "{:.0f}-{:.0f}: {}   ".format(bins[0],bins[1]-1,bin_labels[0])
@@ -149,8 +166,28 @@ def get_cohort(year, course=None, term_taken=None):
     Returns:
         The equivalent cohort
     """
-    # Ensure that the value is an int
-    year = int(year)
+    # Ensure that the value is an int. Doing it here means that 201603 and '201603'
+    # share the same cached result
+    return _get_cohort(int(year), course, term_taken)
+
+
+@functools.lru_cache(maxsize=4096)
+def _get_cohort(year, course, term_taken):
+    """Cached body of get_cohort
+
+    The same years and courses come up for every grades file of a course, so each
+    combination only gets worked out once. The cache lasts for the whole process,
+    which is fine since the term mapping never changes
+
+    Args:
+        year(int): The year, optionally with the semester
+        course: The course name or number
+        term_taken: The term that the course is taken in, or None to find it from
+            the course number
+
+    Returns:
+        int: The equivalent cohort
+    """
     # If term_taken was not passed to the function, find it using the course number
     if term_taken == None:
         term_taken = int(re.search("\d", course).group(0))